@@ -0,0 +1,220 @@
+# benchmarks/generate_dataset.py
+"""
+Генератор синтетичних наборів даних у схемі plants.json.
+
+Розподіли беруться з реального файлу: частоти родин, рівні небезпеки,
+списки тварин (цілими списками, щоб зберегти їх поєднання), словник
+симптомів і кількість симптомів на рослину, слова поширених назв,
+роди та видові епітети наукових назв, кількість зображень. Однаковий
+seed дає однаковий набір. Записи пишуться у файл потоково, тому розмір
+набору обмежений лише диском.
+"""
+import json
+import os
+import random
+import sys
+from collections import Counter
+from itertools import accumulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from log import log, log_error
+from tasks.normalize import slugify
+
+
+LICENSES = ["cc-by", "cc-by-nc", "cc-by-nc-sa", "cc-by-nc-nd", "cc-by-sa", "cc0"]
+
+
+def _weighted(counter):
+    """(значення, накопичені ваги) для random.choices; порядок стабільний для seed."""
+    items = sorted(counter.items(), key=lambda item: (-item[1], json.dumps(item[0], sort_keys=True)))
+    return [value for value, _ in items], list(accumulate(weight for _, weight in items))
+
+
+def _item_name(item):
+    return item.get("name") if isinstance(item, dict) else item
+
+
+class DatasetModel:
+    """Розподіли полів, зібрані з реального набору даних."""
+
+    def __init__(self, raw_plants):
+        families = Counter()
+        severities = Counter()
+        animal_lists = Counter()
+        symptoms = Counter()
+        symptom_counts = Counter()
+        common_counts = Counter()
+        common_words = Counter()
+        image_counts = Counter()
+        licenses = Counter()
+        genera = set()
+        epithets = set()
+        with_url = 0
+
+        for plant in raw_plants:
+            if not isinstance(plant, dict) or not plant.get("name"):
+                continue
+            families[plant.get("family") or ""] += 1
+            severity = plant.get("severity")
+            if isinstance(severity, dict):
+                severities[(severity.get("label"), severity.get("level"), severity.get("slug"))] += 1
+            animal_lists[tuple(a for a in plant.get("animals") or [] if isinstance(a, str))] += 1
+
+            plant_symptoms = [_item_name(s) for s in plant.get("symptoms") or []]
+            plant_symptoms = [s for s in plant_symptoms if s]
+            symptoms.update(plant_symptoms)
+            symptom_counts[len(plant_symptoms)] += 1
+
+            common = [_item_name(c) for c in plant.get("common") or []]
+            common = [c for c in common if c]
+            common_counts[len(common)] += 1
+            for name in common:
+                common_words.update(name.split())
+
+            images = plant.get("images") or []
+            image_counts[len(images)] += 1
+            licenses.update(i.get("license") for i in images if isinstance(i, dict) and i.get("license"))
+
+            parts = plant["name"].split()
+            genera.add(parts[0])
+            if len(parts) > 1:
+                epithets.add(parts[1].lower())
+            with_url += bool(plant.get("wikipedia_url"))
+
+        if not families:
+            raise ValueError("Набір даних не містить коректних записів")
+
+        self.families = _weighted(families)
+        self.severities = _weighted(severities or Counter({("Unknown", 0, "unknown"): 1}))
+        self.animal_lists = _weighted(animal_lists)
+        self.symptoms = _weighted(symptoms or Counter(["Vomiting"]))
+        self.symptom_counts = _weighted(symptom_counts)
+        self.common_counts = _weighted(common_counts)
+        self.common_words = _weighted(common_words or Counter(["Plant"]))
+        self.image_counts = _weighted(image_counts)
+        self.licenses = _weighted(licenses or Counter(LICENSES))
+        self.genera = sorted(genera)
+        self.epithets = sorted(epithets) or ["vulgaris"]
+        self.url_ratio = with_url / sum(families.values())
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict) and "data" in data:
+            data = data["data"]
+        return cls(data)
+
+
+def _pick(rng, distribution, k=1):
+    values, cum_weights = distribution
+    return rng.choices(values, cum_weights=cum_weights, k=k)
+
+
+def _unique_symptoms(rng, model, count):
+    """count різних симптомів із урахуванням частоти в реальних даних."""
+    count = min(count, len(model.symptoms[0]))
+    result = []
+    seen = set()
+    while len(result) < count:
+        for symptom in _pick(rng, model.symptoms, count * 2):
+            if symptom not in seen:
+                seen.add(symptom)
+                result.append(symptom)
+                if len(result) == count:
+                    break
+    return result
+
+
+def generate_plants(model, count, seed=0, images=True):
+    """Генерує count записів у схемі plants.json (ітератор словників)."""
+    rng = random.Random(seed)
+    used_names = set()
+
+    for index in range(count):
+        name = f"{rng.choice(model.genera)} {rng.choice(model.epithets)}"
+        if name in used_names:
+            name = f"{name} var. {rng.choice(model.epithets)}"
+            if name in used_names:
+                name = f"{name} {index}"
+        used_names.add(name)
+        slug = slugify(name)
+
+        common = []
+        for _ in range(_pick(rng, model.common_counts)[0]):
+            words = _pick(rng, model.common_words, rng.randint(1, 3))
+            common_name = " ".join(words)
+            common.append({"name": common_name, "slug": slugify(common_name)})
+
+        label, level, severity_slug = _pick(rng, model.severities)[0]
+        plant = {
+            "animals": list(_pick(rng, model.animal_lists)[0]),
+            "common": common,
+            "family": _pick(rng, model.families)[0],
+            "name": name,
+            "pid": slug,
+            "severity": {"label": label, "level": level, "slug": severity_slug},
+            "symptoms": [{"name": s, "slug": slugify(s)}
+                         for s in _unique_symptoms(rng, model, _pick(rng, model.symptom_counts)[0])],
+            "wikipedia_url": (f"https://en.wikipedia.org/wiki/{name.replace(' ', '_')}"
+                              if rng.random() < model.url_ratio else None),
+        }
+        if images:
+            plant["images"] = [{
+                "attribution": "(c) synthetic, some rights reserved",
+                "license": _pick(rng, model.licenses)[0],
+                "relative_path": f"images/plants/{slug}/{rng.getrandbits(128):032x}",
+                "source_url": f"https://example.org/photos/{rng.randrange(10 ** 8)}/large.jpg",
+            } for _ in range(_pick(rng, model.image_counts)[0])]
+        else:
+            plant["images"] = []
+        yield plant
+
+
+def write_dataset(path, count, seed=0, source=None, images=True):
+    """Записує синтетичний набір з count рослин у path. Повертає розмір файлу."""
+    model = DatasetModel.from_file(source or os.path.join(ROOT, "plants.json"))
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for index, plant in enumerate(generate_plants(model, count, seed, images)):
+            f.write(",\n" if index else "\n")
+            f.write(json.dumps(plant, ensure_ascii=False))
+        f.write("\n]\n")
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Генерація синтетичного набору даних рослин")
+    parser.add_argument("output", help="Шлях до JSON файлу, що буде створено")
+    parser.add_argument("--records", type=int, default=100000,
+                        help="Кількість рослин (за замовчуванням: 100000)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Seed генератора (за замовчуванням: 0)")
+    parser.add_argument("--source", default=os.path.join(ROOT, "plants.json"),
+                        help="Реальний набір даних, з якого беруться розподіли")
+    parser.add_argument("--no-images", action="store_true",
+                        help="Не генерувати масиви images (менший файл)")
+
+    args = parser.parse_args()
+
+    if os.path.abspath(args.output) == os.path.abspath(args.source):
+        log_error("Вихідний файл збігається з джерелом розподілів")
+        return 1
+    try:
+        size = write_dataset(args.output, args.records, args.seed, args.source,
+                             images=not args.no_images)
+    except (OSError, ValueError) as e:
+        log_error(f"{e}")
+        return 1
+    log(f"Створено {args.output}: {args.records} рослин, {size / 1e6:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
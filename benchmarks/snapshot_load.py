@@ -0,0 +1,138 @@
+# benchmarks/snapshot_load.py
+"""
+Бенчмарк холодного завантаження: load_plants_data без знімка і зі свіжим знімком.
+
+Обидва виміри проходять повний шлях, яким дані отримують задачі
+(load_plants_data(use_cache=False)): без знімка це json.load і нормалізація
+записів, зі знімком - читання готових PlantRecord.
+
+Синтетичний набір даних будується тиражуванням записів plants.json
+з унікальними pid та назвами. Окрім часу, вимірюється пам'ять (tracemalloc),
+яку займають сирі словники з json.load і компактні записи PlantRecord.
+Результат виводиться у stdout як JSON, журнал - у stderr.
+"""
+import contextlib
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from log import log
+from tasks.snapshot import load_snapshot, snapshot_path, write_snapshot
+from tasks.utils import load_plants_data
+
+
+def build_dataset(source, records, path):
+    """Записує у path набір з records рослин на основі source."""
+    with open(source, "r", encoding="utf-8") as f:
+        plants = json.load(f)
+    if isinstance(plants, dict) and "data" in plants:
+        plants = plants["data"]
+    data = []
+    for i in range(records):
+        plant = dict(plants[i % len(plants)])
+        copy_no = i // len(plants)
+        if copy_no:
+            plant["pid"] = f"{plant['pid']}-{copy_no}"
+            plant["name"] = f"{plant['name']} {copy_no}"
+        data.append(plant)
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def _time(func, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def _memory(func):
+    """Пам'ять (байти), яку займає результат func, за tracemalloc."""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func()
+        return tracemalloc.get_traced_memory()[0], result
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Бенчмарк завантаження plants.json та знімка")
+    parser.add_argument("--source", default=os.path.join(ROOT, "plants.json"),
+                        help="Вихідний JSON файл з даними")
+    parser.add_argument("--records", type=int, default=100000,
+                        help="Кількість рослин у синтетичному наборі (за замовчуванням: 100000)")
+    parser.add_argument("--repeats", type=int, default=3,
+                        help="Кількість повторів кожного вимірювання")
+
+    args = parser.parse_args()
+
+    # Журнал виконання - у stderr, щоб stdout можна було розібрати як JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        result = run(args)
+    print(json.dumps(result, ensure_ascii=False))
+    return 0
+
+
+def run(args):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        json_path = os.path.join(tmp_dir, "plants.json")
+        build_dataset(args.source, args.records, json_path)
+
+        def load():
+            return load_plants_data(json_path, use_cache=False)
+
+        # Без знімка: JSON + нормалізація, як при першому запуску
+        json_time = _time(load, args.repeats)
+        json_records = len(load())
+
+        start = time.perf_counter()
+        write_snapshot(json_path)
+        build_time = time.perf_counter() - start
+
+        snapshot_time = _time(load, args.repeats)
+        if len(load()) != json_records:
+            raise RuntimeError("Знімок дав іншу кількість записів, ніж JSON")
+
+        def read_json():
+            with open(json_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+
+        json_memory, _ = _memory(read_json)
+        records_memory, _ = _memory(lambda: load_snapshot(json_path))
+
+        result = {
+            "records": args.records,
+            "json_bytes": os.path.getsize(json_path),
+            "snapshot_bytes": os.path.getsize(snapshot_path(json_path)),
+            "snapshot_build_s": round(build_time, 4),
+            "json_load_s": round(json_time, 4),
+            "snapshot_load_s": round(snapshot_time, 4),
+            "speedup": round(json_time / snapshot_time, 1) if snapshot_time else None,
+            "json_memory_mb": round(json_memory / 1e6, 1),
+            "records_memory_mb": round(records_memory / 1e6, 1),
+        }
+
+    log(f"load_plants_data без знімка: {result['json_load_s']} с, зі знімком: {result['snapshot_load_s']} с "
+        f"(x{result['speedup']})")
+    log(f"Пам'ять: json.load {result['json_memory_mb']} MB, "
+        f"PlantRecord {result['records_memory_mb']} MB")
+    return result
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+# benchmarks/task_suite.py
+"""
+Бенчмарк усіх задач на синтетичних наборах різного розміру.
+
+Для кожного розміру генерується набір (generate_dataset.py) і вимірюються:
+завантажувач (JSON і знімок), потоковий iter_plants, побудова знімка та
+стовпцевого сховища, шість функцій задач, групування (groupby.py),
+save_results і влучання в кеш результатів. Для задач окремо фіксується
+перший виклик (з побудовою індексів) і медіана повторних; кеш результатів
+для них вимкнено.
+Результати виводяться у JSON (stdout містить лише звіт, журнал виконання
+йде у stderr); з --baseline порівнюються зі збереженим базовим запуском,
+і код повернення 1 означає регресію.
+"""
+import contextlib
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from log import log, log_error
+from generate_dataset import write_dataset
+from tasks.utils import clear_plants_cache, iter_plants, load_plants_data, save_results, set_protocol_path
+from tasks.snapshot import write_snapshot
+from tasks.result_cache import reset_result_cache
+from tasks.columnar import write_columnar_store
+from tasks.top_families import analyze_top_families
+from tasks.severity_stats import analyze_severity_statistics
+from tasks.search_animals import search_dangerous_plants_for_animal
+from tasks.search_symptoms import search_plants_by_symptom
+from tasks.first_aid import get_first_aid_info
+from tasks.safe_alternatives import find_safe_alternatives
+from tasks.groupby import group_by
+
+
+DEFAULT_SIZES = "1000,10000,100000"
+# Регресією вважається повільніший запуск, якщо різниця більша і за поріг, і за шум
+NOISE_SECONDS = 0.001
+
+
+def _measure(func, repeats):
+    """Час першого виклику і статистика повторних (секунди)."""
+    start = time.perf_counter()
+    result = func()
+    first = time.perf_counter() - start
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    timings = timings or [first]
+    return result, {
+        "first_s": round(first, 6),
+        "median_s": round(statistics.median(timings), 6),
+        "min_s": round(min(timings), 6),
+        "max_s": round(max(timings), 6),
+    }
+
+
+def _once(func):
+    start = time.perf_counter()
+    func()
+    elapsed = round(time.perf_counter() - start, 6)
+    return {"first_s": elapsed, "median_s": elapsed, "min_s": elapsed, "max_s": elapsed}
+
+
+def run_size(records, seed, repeats, source, images, tmp_dir):
+    """Вимірювання для одного розміру набору. Повертає список результатів."""
+    json_path = os.path.join(tmp_dir, f"plants_{records}.json")
+    results = []
+
+    def add(name, timing):
+        results.append(dict({"records": records, "benchmark": name}, **timing))
+        log(f"  {name}: {timing['median_s']:.4f} с")
+
+    start = time.perf_counter()
+    size = write_dataset(json_path, records, seed, source, images)
+    log(f"Набір {records} рослин ({size / 1e6:.1f} MB) за {time.perf_counter() - start:.1f} с")
+
+    def load_uncached():
+        clear_plants_cache()
+        return load_plants_data(json_path, use_cache=False)
+
+    add("loader.json", _measure(load_uncached, repeats)[1])
+    add("loader.iter_plants", _measure(lambda: sum(1 for _ in iter_plants(json_path)), repeats)[1])
+
+    plants = load_plants_data(json_path, use_cache=False)
+    add("snapshot.build", _once(lambda: write_snapshot(json_path, plants)))
+    add("columns.build", _once(lambda: write_columnar_store(json_path, plants)))
+    add("loader.snapshot", _measure(load_uncached, repeats)[1])
+
+    # Задачі працюють з даними в кеші процесу, як у демоні чи main_launcher
+    clear_plants_cache()
+    plants = load_plants_data(json_path)
+    probe = plants[len(plants) // 2].name
+    tasks = [
+        ("top_families", lambda: analyze_top_families(json_path)),
+        ("severity_stats", lambda: analyze_severity_statistics(json_path)),
+        ("search_animals", lambda: search_dangerous_plants_for_animal("dogs", json_path)),
+        ("search_symptoms", lambda: search_plants_by_symptom("vomiting", json_path)),
+        ("first_aid", lambda: get_first_aid_info(probe, json_path)),
+        ("safe_alternatives", lambda: find_safe_alternatives(probe, ["dogs", "cats"], json_path)),
+        ("top_families.stream", lambda: analyze_top_families(json_path, stream=True)),
+        ("top_families.approximate", lambda: analyze_top_families(json_path, stream=True, approximate=True)),
+        ("group_by.family_severity", lambda: group_by(["family", "severity"], json_path)),
+        ("group_by.family_symptom", lambda: group_by(["family", "symptom"], json_path)),
+    ]
+    largest = None
+    for name, func in tasks:
+        result, timing = _measure(func, repeats)
+        add(name, timing)
+        if name == "search_animals":
+            largest = result
+
+    output_path = os.path.join(tmp_dir, "results.json")
+    add("save_results", _measure(lambda: save_results(largest, output_path), repeats)[1])
+    add("save_results.compact", _measure(lambda: save_results(largest, output_path, compact=True), repeats)[1])
+    add("save_results.gzip", _measure(lambda: save_results(largest, output_path + ".gz", compact=True),
+                                      repeats)[1])
+    add("search_animals.lazy_save", _measure(
+        lambda: save_results(search_dangerous_plants_for_animal("dogs", json_path, lazy=True),
+                             output_path, compact=True), repeats)[1])
+
+    disabled = os.environ.pop("GREENLEAF_NO_RESULT_CACHE", None)
+    add("result_cache.hit", _measure(lambda: search_plants_by_symptom("vomiting", json_path), repeats)[1])
+    if disabled is not None:
+        os.environ["GREENLEAF_NO_RESULT_CACHE"] = disabled
+
+    for path in os.listdir(tmp_dir):
+        os.remove(os.path.join(tmp_dir, path))
+    clear_plants_cache()
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Порівнює медіани з базовим запуском. Повертає список регресій."""
+    base = {(r["records"], r["benchmark"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for r in results:
+        old = base.get((r["records"], r["benchmark"]))
+        if old is None or not old["median_s"]:
+            continue
+        ratio = r["median_s"] / old["median_s"]
+        r["baseline_median_s"] = old["median_s"]
+        r["ratio"] = round(ratio, 3)
+        if ratio > threshold and r["median_s"] - old["median_s"] > NOISE_SECONDS:
+            regressions.append(r)
+    return regressions
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Бенчмарк задач на синтетичних наборах даних")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"Розміри наборів через кому (за замовчуванням: {DEFAULT_SIZES})")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="Кількість повторів кожного вимірювання (за замовчуванням: 5)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed генератора наборів")
+    parser.add_argument("--source", default=os.path.join(ROOT, "plants.json"),
+                        help="Реальний набір даних, з якого беруться розподіли")
+    parser.add_argument("--images", action="store_true",
+                        help="Генерувати масиви images (реалістичний розмір файлу, повільніше)")
+    parser.add_argument("--output", default=None,
+                        help="Файл для JSON результатів (за замовчуванням: stdout)")
+    parser.add_argument("--baseline", default=None,
+                        help="JSON результати попереднього запуску для порівняння")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Допустиме сповільнення відносно базового запуску (за замовчуванням: 1.25)")
+
+    args = parser.parse_args()
+
+    # Журнал виконання - у stderr, щоб stdout можна було розібрати як JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        status, encoded = run_suite(args)
+    if encoded is not None:
+        print(encoded)
+    return status
+
+
+def run_suite(args):
+    """Виконує бенчмарк. Повертає (код повернення, JSON звіт для stdout або None)."""
+    try:
+        sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    except ValueError:
+        log_error(f"Некоректний список розмірів: {args.sizes}")
+        return 1, None
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            log_error(f"Не вдалося прочитати базовий запуск: {e}")
+            return 1, None
+
+    results = []
+    saved_env = {name: os.environ.get(name) for name in ("GREENLEAF_NO_RESULT_CACHE", "GREENLEAF_CACHE_DIR")}
+    with tempfile.TemporaryDirectory() as tmp_dir, tempfile.TemporaryDirectory() as work_dir:
+        # Повторні виклики мають обчислюватися, а не братися з кешу результатів
+        os.environ["GREENLEAF_NO_RESULT_CACHE"] = "1"
+        os.environ["GREENLEAF_CACHE_DIR"] = os.path.join(work_dir, "cache")
+        reset_result_cache()
+        # Записи задач не потрапляють у protocol.txt проєкту
+        previous_protocol = set_protocol_path(os.path.join(work_dir, "protocol.txt"))
+        try:
+            for records in sizes:
+                results.extend(run_size(records, args.seed, args.repeats, args.source, args.images, tmp_dir))
+        finally:
+            set_protocol_path(previous_protocol)
+            # Статистика кешу зберігається, поки його папка ще існує
+            reset_result_cache()
+            for name, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "repeats": args.repeats,
+            "images": args.images,
+        },
+        "results": results,
+    }
+
+    regressions = []
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        report["regressions"] = [f"{r['records']}:{r['benchmark']}" for r in regressions]
+        for r in regressions:
+            log_error(f"Регресія {r['benchmark']} ({r['records']} рослин): "
+                      f"{r['baseline_median_s']:.4f} -> {r['median_s']:.4f} с (x{r['ratio']})")
+        if not regressions:
+            log(f"Регресій відносно {args.baseline} немає")
+
+    encoded = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(encoded + "\n")
+        log(f"Результати збережено у {args.output}")
+        encoded = None
+    return (1 if regressions else 0), encoded
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,33 @@
 import os
 import sys
 import json
+import queue
+import hashlib
+import shutil
+import importlib
 import requests
 import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
 from log import log, log_error
+from tasks.snapshot import file_sha256, snapshot_is_fresh, write_snapshot
+from tasks.columnar import open_columnar_store, write_columnar_store
+from tasks.changes import apply_changeset, is_empty
+from tasks.client import query_daemon
+from tasks.normalize import normalize_plants, report_rejected
+from tasks.utils import load_plants_data, log_protocol, flush_protocol, set_default_mode
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 
 def setup_project_structure():  # Створює необхідну структуру папок
@@ -15,50 +36,137 @@ def setup_project_structure():  # Створює необхідну структ
         Path(folder).mkdir(exist_ok=True)
 
 
-def download_plants_data():  # Завантажує дані з API або створює тестові дані
-    API_URL = "https://plantsm.art/api/plants.json"
-    DATA_FILE = "plants.json"
+API_URL = "https://plantsm.art/api/plants.json"
+DATA_FILE = "plants.json"
 
-    if os.path.exists(DATA_FILE):
-        log(f"Файл {DATA_FILE} вже існує")
-        file_date = datetime.fromtimestamp(os.path.getmtime(DATA_FILE)).date()
-        today = datetime.now().date()
 
-        if file_date == today:
-            log("Дані за сьогодні вже завантажені")
-            return True
-        else:
-            log_error(f"Дані застарілі (останнє оновлення: {file_date})")
+def validators_path(data_file):  # Файл з ETag/Last-Modified останнього завантаження
+    return os.path.splitext(data_file)[0] + ".meta.json"
 
-    try:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-            "Accept": "application/json",
-        }
 
-        response = requests.get(API_URL, headers=headers, timeout=30)  #  Запит до API
-        response.raise_for_status()  # Перевірка на помилки HTTP
+def load_validators(data_file):
+    """ETag/Last-Modified, якщо вони описують саме той файл, що лежить на диску.
 
-        data = response.json()  # Парсинг JSON відповіді
-        with open(DATA_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)  # Збереження у файл
+    Після локальної зміни файлу чи запису тестових даних відповідь 304
+    залишила б на диску не ті дані, тому такі валідатори ігноруються.
+    """
+    try:
+        with open(validators_path(data_file), "r", encoding="utf-8") as f:
+            validators = json.load(f)
+        if os.path.getsize(data_file) != validators.get("size") or \
+                file_sha256(data_file).hex() != validators.get("sha256"):
+            return {}
+        return validators
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+
+def save_validators(data_file, response, size, sha256):
+    """Зберігає валідатори відповіді разом з розміром і SHA-256 збереженого тіла."""
+    validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "downloaded_at": datetime.now().isoformat(),
+        "size": size,
+        "sha256": sha256,
+    }
+    path = validators_path(data_file)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(validators, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def refresh_derived_data(data_file, data=None):  # Знімок і стовпцеве сховище
+    """Оновлює похідні файли після нового plants.json.
+
+    Дельта за pid застосовується до структур у пам'яті (кеш даних, індекси,
+    демон). Знімок і стовпцеве сховище - цілісні образи (pickle; таблиця рядків
+    зі зміщеннями і словникові коди), де одна змінена рослина зсуває всі
+    наступні зміщення, тому вони переписуються повністю, але з уже
+    нормалізованих записів і лише коли записи змінилися або файл застарів.
+    """
+    changed = False
+    if data is not None:
+        changed = not is_empty(apply_changeset(data_file, data))
+    # Без змін записів застарілий файл будується з data, без повторного читання JSON
+    if changed or not snapshot_is_fresh(data_file):
+        write_snapshot(data_file, data)
+    if changed or open_columnar_store(data_file) is None:
+        write_columnar_store(data_file, data)
+    if changed:
+        query_daemon("reload", {"input_file": data_file}, timeout=10)  # Якщо демон запущений
+
+
+def download_plants_data(api_url=API_URL, data_file=DATA_FILE):  # Завантажує дані з API або створює тестові дані
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+        "Accept": "application/json",
+        "Accept-Encoding": "gzip",
+    }
 
-        log(f"Дані успішно завантажено! Збережено в {DATA_FILE}")
+    # Умовний запит: сервер відповість 304, якщо дані не змінилися
+    validators = load_validators(data_file)
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
 
-        with open("protocol.txt", "a", encoding="utf-8") as f:
-            f.write(
-                f"[{datetime.now()}] Завантажено {len(data.get('data', []))} рослин з API\n"
-            )
+    tmp_path = None
+    try:
+        with requests.get(api_url, headers=headers, timeout=30, stream=True) as response:
+            if response.status_code == 304:
+                log("Дані актуальні (сервер повідомив, що змін немає)")
+                refresh_derived_data(data_file)
+                return True
+            response.raise_for_status()  # Перевірка на помилки HTTP
+
+            # Потокове збереження у тимчасовий файл поруч з цільовим
+            directory = os.path.dirname(os.path.abspath(data_file))
+            fd, tmp_path = tempfile.mkstemp(prefix=".plants-", suffix=".tmp", dir=directory)
+            set_default_mode(fd)  # Права як у файлу, створеного open(), а не 0600
+            body = hashlib.sha256()
+            with os.fdopen(fd, "wb") as f:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    f.write(chunk)
+                    body.update(chunk)
+                size = f.tell()
+
+        with open(tmp_path, "r", encoding="utf-8") as f:
+            data = json.load(f)  # Перевірка, що отримано коректний JSON
+        plants = data.get("data") if isinstance(data, dict) else data
+        if not isinstance(plants, list):
+            raise ValueError("Неочікувана структура даних")
+        plants, rejected = normalize_plants(plants)  # Канонічні записи для всіх задач
+        report_rejected(rejected, api_url)
+        if not plants and rejected:
+            raise ValueError("Немає жодного коректного запису")
+
+        os.replace(tmp_path, data_file)  # Атомарна заміна файлу
+        tmp_path = None
+        save_validators(data_file, response, size, body.hexdigest())
+        refresh_derived_data(data_file, plants)
+
+        log(f"Дані успішно завантажено! Збережено в {data_file}")
+
+        log_protocol(f"Завантажено {len(plants)} рослин з API")
 
         return True
 
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, ValueError) as e:
         log_error(f"Помилка завантаження: {e}")
+        if os.path.exists(data_file):
+            log_error(f"Використовуються наявні дані з {data_file}")
+            refresh_derived_data(data_file)
+            return True
         log_error("Використовуються тестові дані...")
-        return create_sample_data()
+        return create_sample_data(data_file)
+    finally:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 
-def create_sample_data():  # Створює тестові дані, якщо завантаження не вдалося
+def create_sample_data(data_file=DATA_FILE):  # Створює тестові дані, якщо завантаження не вдалося
     sample_data = {
         "data": [
             {
@@ -80,13 +188,84 @@ def create_sample_data():  # Створює тестові дані, якщо з
         ]
     }
 
-    with open("plants.json", "w", encoding="utf-8") as f:
+    with open(data_file, "w", encoding="utf-8") as f:
         json.dump(sample_data, f, ensure_ascii=False, indent=2)
+    refresh_derived_data(data_file, normalize_plants(sample_data["data"])[0])
 
     log("Створено тестові дані (2 рослини)")
     return True
 
 
+BUILD_DIR = Path(".build")
+BUILD_CACHE = BUILD_DIR / "cache.json"
+
+
+def load_build_cache():  # Хеші входів і результатів попередніх збірок
+    try:
+        with open(BUILD_CACHE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_build_cache(cache):
+    BUILD_DIR.mkdir(exist_ok=True)
+    tmp_path = f"{BUILD_CACHE}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, BUILD_CACHE)
+
+
+def file_digest(path):
+    return file_sha256(path).hex()
+
+
+def tool_version(tool, cache):
+    """Версія інструмента JDK або None, якщо його не знайдено.
+
+    "tool -version" запускає JVM, тому версія запам'ятовується для шляху,
+    розміру і mtime виконуваного файлу і перевіряється знову лише після
+    оновлення JDK.
+    """
+    path = shutil.which(tool)
+    if path is None:
+        return None
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    known = cache.setdefault("tools", {}).get(path)
+    if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+        return known["version"]
+
+    try:
+        result = subprocess.run([path, "-version"], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    version = (result.stdout or result.stderr).strip() or path
+    cache["tools"][path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "version": version}
+    return version
+
+
+def build_is_current(cache, step, inputs, tool):
+    """Чи збігаються входи і версія інструмента з попередньою збіркою, а її результати на місці."""
+    entry = cache.get(step)
+    if not entry or entry.get("inputs") != inputs or entry.get("tool") != tool:
+        return False
+    try:
+        return all(file_digest(path) == digest for path, digest in entry["outputs"].items())
+    except OSError:
+        return False
+
+
+def record_build(cache, step, inputs, tool, outputs):
+    cache[step] = {
+        "inputs": inputs,
+        "tool": tool,
+        "outputs": {str(path): file_digest(path) for path in outputs},
+        "built_at": datetime.now().isoformat(),
+    }
+    save_build_cache(cache)
+
+
 def compile_java_project():  # Компілює Java проект
     JAVA_SOURCE = "PlantGuide.java"  # Ім'я Java файлу
 
@@ -94,6 +273,17 @@ def compile_java_project():  # Компілює Java проект
         log_error(f"Файл {JAVA_SOURCE} не знайдено!")
         return False
 
+    cache = load_build_cache()
+    javac = tool_version("javac", cache)
+    if javac is None:
+        log_error("Java Development Kit (JDK) не встановлено або javac не знайдено")
+        return False
+
+    inputs = {JAVA_SOURCE: file_digest(JAVA_SOURCE)}
+    if build_is_current(cache, "javac", inputs, javac):
+        log("Java код не змінився - компіляцію пропущено")
+        return True
+
     log("Компіляція Java коду...")  # Компіляція Java коду
     try:
         result = subprocess.run(
@@ -104,6 +294,9 @@ def compile_java_project():  # Компілює Java проект
         )  # Запуск процесу компіляції
 
         if result.returncode == 0:
+            stem = Path(JAVA_SOURCE).stem
+            classes = [Path(f"{stem}.class"), *sorted(Path(".").glob(f"{stem}$*.class"))]
+            record_build(cache, "javac", inputs, javac, [path for path in classes if path.exists()])
             log("Java код успішно скомпільовано")
             return True
         else:
@@ -118,62 +311,257 @@ def compile_java_project():  # Компілює Java проект
         return False
 
 
-def create_release_folder():
-    """Створює повноцінну папку Release з усіма необхідними файлами для розповсюдження."""
-    import shutil
-    from datetime import datetime
+# Файли кореня проєкту, що входять до Release
+RELEASE_FILES = [
+    "main_launcher.py",
+    "log.py",
+    "plants.json",
+    "plants.snapshot",
+    "plants.columns",
+    "PlantGuide.java",
+    "instructions.md",
+    "Архітектура проєкту.md",
+]
+RELEASE_MANIFEST = ".manifest.json"
+RELEASE_ARCHIVE = "GreenLeaf-Release.zip"
+# Файли, що дописуються на місці: у Release потрапляє копія, а не жорстке посилання
+NO_HARDLINK = {"protocol.txt"}
+FICLONE = 0x40049409  # ioctl клонування файлу (Linux: Btrfs, XFS)
+
+
+def build_release_jar(cache):
+    """Збирає .build/GreenLeaf.jar або бере його з кешу збірки. Повертає шлях або None."""
+    manifest = BUILD_DIR / "MANIFEST.MF"
+    manifest_content = "Manifest-Version: 1.0\nMain-Class: PlantGuide\n\n"
+    BUILD_DIR.mkdir(exist_ok=True)
+    if not manifest.exists() or manifest.read_text() != manifest_content:
+        manifest.write_text(manifest_content)
+
+    # JAR перезбирається лише після зміни маніфесту, класу або версії jar
+    jar_tool = tool_version("jar", cache)
+    cached_jar = BUILD_DIR / "GreenLeaf.jar"
+    inputs = {
+        "MANIFEST.MF": file_digest(manifest),
+        "PlantGuide.class": file_digest("PlantGuide.class"),
+    }
+    if jar_tool is None:
+        log_error("Команда 'jar' не знайдена. JAR файл не створено.")
+        return None
+    if build_is_current(cache, "jar", inputs, jar_tool):
+        return cached_jar
+
+    shutil.copy2("PlantGuide.class", BUILD_DIR / "PlantGuide.class")
+    try:
+        result = subprocess.run(
+            ["jar", "cfm", "GreenLeaf.jar", "MANIFEST.MF", "PlantGuide.class"],
+            cwd=BUILD_DIR,
+            capture_output=True,
+            text=True,
+        )
+    except FileNotFoundError:
+        log_error("Команда 'jar' не знайдена. JAR файл не створено.")
+        return None
+    if result.returncode != 0:
+        log_error(f"Помилка створення JAR: {result.stderr}")
+        return None
+    record_build(cache, "jar", inputs, jar_tool, [cached_jar])
+    log("  Створено: GreenLeaf.jar")
+    return cached_jar
+
+
+def _reflink(src, dst):
+    """Клонує файл без копіювання даних, якщо файлова система це підтримує."""
+    if fcntl is None or not sys.platform.startswith("linux"):
+        return False
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        shutil.copystat(src, dst)
+        return True
+    except OSError:
+        try:
+            os.remove(dst)
+        except OSError:
+            pass
+        return False
+
 
+def place_file(src, dst, hardlink=True):
+    """Атомарно розміщує src у dst: reflink, жорстке посилання або копія."""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    if _reflink(src, tmp):
+        return_method = "reflink"
+    else:
+        try:
+            if not hardlink:
+                raise OSError
+            os.link(src, tmp)
+            return_method = "посилання"
+        except OSError:  # Інша файлова система або посилання не підтримуються
+            shutil.copy2(src, tmp)
+            return_method = "копія"
+    os.replace(tmp, dst)
+    return return_method
+
+
+def load_release_manifest(release_dir):
+    try:
+        with open(release_dir / RELEASE_MANIFEST, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_release_manifest(release_dir, manifest):
+    tmp = release_dir / f"{RELEASE_MANIFEST}.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps(manifest, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, release_dir / RELEASE_MANIFEST)
+
+
+def sync_release(release_dir, sources, generated, workers=None):
+    """Синхронізує release_dir з планом за маніфестом вмісту.
+
+    sources - {відносний шлях: файл-джерело}, generated - {відносний шлях: bytes}.
+    Файл записується лише тоді, коли змінився його вміст; джерело з тим самим
+    розміром і mtime навіть не хешується. Файли, яких немає в плані,
+    видаляються. Повертає (записи маніфесту, {дія: кількість}).
+    """
+    previous = load_release_manifest(release_dir)
+    old = previous["files"] if previous else {}
+
+    def in_place(rel, size):
+        try:
+            return rel in old and (release_dir / rel).stat().st_size == size
+        except OSError:
+            return False
+
+    def sync_source(rel, src):
+        stat = src.stat()
+        entry = old.get(rel)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        if entry and entry.get("source") == signature and in_place(rel, entry["size"]):
+            return rel, entry, None
+        new_entry = {"sha256": file_digest(src), "size": stat.st_size, "source": signature}
+        if entry and entry["sha256"] == new_entry["sha256"] and in_place(rel, entry["size"]):
+            return rel, new_entry, None
+        return rel, new_entry, place_file(src, release_dir / rel, rel not in NO_HARDLINK)
+
+    def sync_generated(rel, content):
+        new_entry = {"sha256": hashlib.sha256(content).hexdigest(), "size": len(content)}
+        entry = old.get(rel)
+        if entry and entry["sha256"] == new_entry["sha256"] and in_place(rel, len(content)):
+            return rel, new_entry, None
+        dst = release_dir / rel
+        tmp = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(content)
+        os.replace(tmp, dst)
+        return rel, new_entry, "створено"
+
+    release_dir.mkdir(exist_ok=True)
+    files = {}
+    actions = Counter()
+    with ThreadPoolExecutor(max_workers=workers or min(8, (os.cpu_count() or 1) + 4)) as executor:
+        futures = [executor.submit(sync_source, rel, src) for rel, src in sources.items()]
+        futures += [executor.submit(sync_generated, rel, content) for rel, content in generated.items()]
+        for future in futures:
+            rel, entry, action = future.result()
+            files[rel] = entry
+            actions[action or "без змін"] += 1
+            if action:
+                log(f"  Оновлено: {rel} ({action})")
+
+    # Без маніфесту (перша синхронізація) невідомо, що лежить у папці - обходимо її
+    if previous is None:
+        stale = [path.relative_to(release_dir).as_posix() for path in release_dir.rglob("*")
+                 if path.is_file() and path.name != RELEASE_MANIFEST]
+    else:
+        stale = list(old)
+    stale = [rel for rel in stale if rel not in files]
+    for rel in stale:
+        try:
+            os.remove(release_dir / rel)
+            actions["видалено"] += 1
+        except OSError:
+            pass
+    for folder in sorted({(release_dir / rel).parent for rel in stale}, reverse=True):
+        while folder != release_dir and folder.exists() and not any(folder.iterdir()):
+            folder.rmdir()
+            folder = folder.parent
+
+    manifest = {"files": dict(sorted(files.items())), "archive": (previous or {}).get("archive")}
+    save_release_manifest(release_dir, manifest)
+    return manifest["files"], actions
+
+
+def write_release_archive(release_dir, archive_path, date_time):
+    """Відтворюваний zip папки: сталий порядок, час і права файлів.
+
+    Повертає False, якщо архів для цього вмісту вже існує.
+    """
+    import zipfile
+
+    manifest = load_release_manifest(release_dir)
+    files = manifest["files"]
+    digest = hashlib.sha256(json.dumps(
+        [[rel, entry["sha256"]] for rel, entry in sorted(files.items())] + [list(date_time)]
+    ).encode("utf-8")).hexdigest()
+    archive = manifest.get("archive") or {}
+    if archive.get("digest") == digest and os.path.exists(archive_path) \
+            and file_digest(archive_path) == archive.get("sha256"):
+        return False
+
+    tmp_path = f"{archive_path}.{os.getpid()}.tmp"
+    with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for rel in sorted(files):
+            info = zipfile.ZipInfo(f"{release_dir.name}/{rel}", date_time=date_time)
+            info.create_system = 3  # Однакові атрибути незалежно від ОС збірки
+            info.external_attr = (0o755 if rel.endswith(".sh") else 0o644) << 16
+            info.compress_type = zipfile.ZIP_DEFLATED
+            zf.writestr(info, (release_dir / rel).read_bytes(), compresslevel=9)
+    os.replace(tmp_path, archive_path)
+
+    manifest["archive"] = {"path": str(archive_path), "digest": digest, "sha256": file_digest(archive_path)}
+    save_release_manifest(release_dir, manifest)
+    return True
+
+
+def create_release_folder(archive=False):
+    """Створює або оновлює папку Release з усіма необхідними файлами для розповсюдження.
+
+    Записуються лише змінені файли (за маніфестом Release/.manifest.json).
+    archive=True додатково створює відтворюваний архів GreenLeaf-Release.zip.
+    """
+    start = time.perf_counter()
     release_dir = Path("Release")
+    log("Оновлення папки Release...")
+
+    sources = {name: Path(name) for name in RELEASE_FILES if Path(name).exists()}
+    for root, dirs, names in os.walk("tasks"):
+        dirs[:] = [d for d in dirs if d != "__pycache__"]
+        for name in names:
+            if not name.endswith((".pyc", ".tmp")):
+                path = Path(root, name)
+                sources[path.as_posix()] = path
 
-    # Очистити попередню версію Release
-    if release_dir.exists():
-        shutil.rmtree(release_dir)
-    release_dir.mkdir()
-
-    log("Створення папки Release...")
-
-    # Список файлів для копіювання
-    files_to_copy = [
-        "main_launcher.py",
-        "log.py",
-        "plants.json",
-        "PlantGuide.java",
-        "instructions.md",
-        "Архітектура проєкту.md",
-    ]
-
-    for file_path in files_to_copy:
-        src = Path(file_path)
-        if src.exists():
-            shutil.copy2(src, release_dir / src.name)
-            log(f"  Скопійовано: {src.name}")
-
-    # Копіювання папки tasks
-    tasks_src = Path("tasks")
-    if tasks_src.exists():
-        shutil.copytree(tasks_src, release_dir / "tasks", dirs_exist_ok=True)
-        log("  Скопійовано: tasks/")
-
-    # Створення JAR файлу
+    generated = {}
     if Path("PlantGuide.class").exists():
-        shutil.copy2("PlantGuide.class", release_dir / "PlantGuide.class")
+        sources["PlantGuide.class"] = Path("PlantGuide.class")
+        generated["MANIFEST.MF"] = b"Manifest-Version: 1.0\nMain-Class: PlantGuide\n\n"
+        jar = build_release_jar(load_build_cache())
+        if jar is not None:
+            sources["GreenLeaf.jar"] = jar
 
-        manifest_content = "Manifest-Version: 1.0\nMain-Class: PlantGuide\n\n"
-        (release_dir / "MANIFEST.MF").write_text(manifest_content)
+    # Копіювання протоколу
+    flush_protocol()  # Записи з черги журналу мають потрапити в копію
+    if Path("protocol.txt").exists():
+        sources["protocol.txt"] = Path("protocol.txt")
 
-        try:
-            result = subprocess.run(
-                ["jar", "cfm", "GreenLeaf.jar", "MANIFEST.MF", "PlantGuide.class"],
-                cwd=release_dir,
-                capture_output=True,
-                text=True,
-            )
-            if result.returncode == 0:
-                log("  Створено: GreenLeaf.jar")
-            else:
-                log_error(f"Помилка створення JAR: {result.stderr}")
-        except FileNotFoundError:
-            log_error("Команда 'jar' не знайдена. JAR файл не створено.")
+    # Дата збірки - SOURCE_DATE_EPOCH або час останньої зміни вхідних файлів,
+    # тому однакові входи дають однаковий README і архів
+    epoch = os.environ.get("SOURCE_DATE_EPOCH")
+    build_time = int(epoch) if epoch else int(max(src.stat().st_mtime for src in sources.values()))
+    build_date = datetime.fromtimestamp(build_time)
 
     # Створення скрипта запуску для Windows
     run_bat = """@echo off
@@ -198,8 +586,7 @@ echo Запуск програми...
 python main_launcher.py
 pause
 """
-    (release_dir / "run.bat").write_text(run_bat, encoding="utf-8")
-    log("  Створено: run.bat")
+    generated["run.bat"] = run_bat.encode("utf-8")
 
     # Створення скрипта запуску для Linux/macOS
     run_sh = """#!/bin/bash
@@ -219,14 +606,13 @@ pip3 install requests --quiet 2>/dev/null
 echo "Запуск програми..."
 python3 main_launcher.py
 """
-    (release_dir / "run.sh").write_text(run_sh, encoding="utf-8")
-    log("  Створено: run.sh")
+    generated["run.sh"] = run_sh.encode("utf-8")
 
     # Створення README файлу
     readme_content = f"""GreenLeaf Guide - Release Package
 ==================================
 
-Дата збірки: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+Дата збірки: {build_date.strftime("%Y-%m-%d %H:%M:%S")}
 
 Вміст папки:
 ------------
@@ -261,76 +647,284 @@ Linux/macOS:
     або
     java PlantGuide plants.json
 """
-    (release_dir / "README.txt").write_text(readme_content, encoding="utf-8")
-    log("  Створено: README.txt")
-
-    # Копіювання протоколу
-    if Path("protocol.txt").exists():
-        shutil.copy2("protocol.txt", release_dir / "protocol.txt")
+    generated["README.txt"] = readme_content.encode("utf-8")
 
-    log(f" Папка Release створена: {release_dir.absolute()}")
+    files, actions = sync_release(release_dir, sources, generated)
+    written = sum(n for action, n in actions.items() if action not in ("без змін", "видалено"))
+    log(f" Папка Release оновлена: {release_dir.absolute()}")
+    log(f"Оновлено: {written}, без змін: {actions['без змін']}, видалено: {actions['видалено']} "
+        f"({time.perf_counter() - start:.3f} с)")
 
     # Статистика збірки
-    total_size = sum(f.stat().st_size for f in release_dir.rglob("*") if f.is_file())
-    file_count = sum(1 for _ in release_dir.rglob("*") if _.is_file())
-    log(f"Загалом файлів: {file_count}, розмір: {total_size / 1024:.1f} KB")
+    total_size = sum(entry["size"] for entry in files.values())
+    log(f"Загалом файлів: {len(files)}, розмір: {total_size / 1024:.1f} KB")
+
+    if archive:
+        # Формат zip не підтримує дати до 1980 року
+        date_time = time.gmtime(max(build_time, 315532800))[:6]
+        if write_release_archive(release_dir, RELEASE_ARCHIVE, date_time):
+            log(f"Створено архів {RELEASE_ARCHIVE}")
+        else:
+            log(f"Архів {RELEASE_ARCHIVE} не змінився")
+    return True
+
+
+# Пункти меню аналітичних задач: номер -> модуль у папці tasks
+TASK_MENU = {
+    "1": "top_families",
+    "2": "search_animals",
+    "3": "severity_stats",
+    "4": "search_symptoms",
+    "5": "first_aid",
+    "6": "safe_alternatives",
+}
+
+
+def run_task(name, args=(), isolated=False):
+    """Запускає задачу: у цьому ж процесі або (isolated) окремим інтерпретатором."""
+    if isolated:
+        subprocess.run([sys.executable, f"tasks/{name}.py", *args])
+        return
+
+    module = importlib.import_module(f"tasks.{name}")
+    try:
+        module.main(list(args))
+    except SystemExit:
+        pass  # argparse завершує роботу при некоректних аргументах
+    except KeyboardInterrupt:
+        print()
+        log("Задачу перервано")
+
+
+class _ThreadOutput:
+    """sys.stdout, що перехоплює вивід зареєстрованих потоків у їхні буфери.
+
+    Решта потоків (зокрема головний з input()) пише у вихідний потік як завжди.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffers = {}
 
+    def write(self, text):
+        buffer = self.buffers.get(threading.get_ident())
+        if buffer is None:
+            return self.stream.write(text)
+        buffer.append(text)
+        return len(text)
 
-def main():
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+class StartupTimeline:
+    """Хронологія етапів запуску: початок і тривалість відносно старту процесу.
+
+    Етапи, запущені у фоні через submit(), нічого не друкують самі: їхній вивід
+    накопичується і разом з результатом етапу виводиться головним потоком
+    між ітераціями меню, щоб не змішуватися з запрошенням input().
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.stages = []
+        self._lock = threading.Lock()
+        self._notices = queue.SimpleQueue()
+
+    @contextmanager
+    def stage(self, name):
+        record = {"name": name, "start": time.perf_counter() - self.origin, "end": None, "status": "..."}
+        with self._lock:
+            self.stages.append(record)
+        try:
+            yield record
+            if record["status"] == "...":
+                record["status"] = "ok"
+        except BaseException:
+            record["status"] = "помилка"
+            raise
+        finally:
+            record["end"] = time.perf_counter() - self.origin
+
+    def submit(self, executor, name, func, *args):
+        """Запускає етап у пулі потоків; False або виняток позначаються як помилка."""
+        output = []
+
+        def run():
+            stdout = sys.stdout
+            if not isinstance(stdout, _ThreadOutput):
+                stdout = sys.stdout = _ThreadOutput(stdout)
+            stdout.buffers[threading.get_ident()] = output
+            try:
+                with self.stage(name) as record:
+                    result = func(*args)
+                    if result is False:
+                        record["status"] = "помилка"
+                    return result
+            finally:
+                del stdout.buffers[threading.get_ident()]
+
+        future = executor.submit(run)
+        future.add_done_callback(lambda f: self._notices.put((name, "".join(output), f)))
+        return future
+
+    def notices(self):
+        """Завершені фонові етапи [(назва, вивід, future), ...] з моменту попереднього виклику."""
+        done = []
+        while True:
+            try:
+                done.append(self._notices.get_nowait())
+            except queue.Empty:
+                return done
+
+    def report(self, title="Хронологія запуску"):
+        now = time.perf_counter() - self.origin
+        log(f"{title} ({now:.2f} с):")
+        with self._lock:
+            stages = list(self.stages)
+        for record in stages:
+            end = record["end"] if record["end"] is not None else now
+            state = record["status"] if record["end"] is not None else "триває"
+            print(f"    {record['name']:<10} +{record['start']:6.2f} с  {end - record['start']:6.2f} с  {state}")
+
+
+BACKGROUND_MESSAGES = {
+    "download": "Не вдалося оновити дані, використовуються наявні",
+    "javac": "Продовжую без Java GUI...",
+}
+
+
+def report_background(timeline):
+    """Виводить накопичений вивід і результати фонових етапів, що завершилися."""
+    finished = timeline.notices()
+    for name, output, future in finished:
+        if output:
+            print(output, end="")
+        error = future.exception()
+        if error is not None:
+            log_error(f"Фоновий етап '{name}' завершився з помилкою: {error}")
+        elif future.result() is False:
+            log(BACKGROUND_MESSAGES.get(name, f"Фоновий етап '{name}' не виконано"))
+    if finished and all(record["end"] is not None for record in timeline.stages):
+        timeline.report("Фонові етапи завершено")
+
+
+def wait_stage(future, message):
+    """Чекає на фоновий етап, потрібний для дії; True, якщо етап успішний."""
+    if not future.done():
+        log(message)
+    try:
+        return future.result() is not False
+    except Exception:
+        return False  # Помилку буде виведено report_background
+
+
+def parse_args(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="GreenLeaf Guide - головний сценарій")
+    parser.add_argument(
+        "--subprocess",
+        action="store_true",
+        default=bool(os.environ.get("GREENLEAF_SUBPROCESS")),
+        help="Запускати кожну задачу окремим процесом Python",
+    )
+    parser.add_argument(
+        "--release",
+        action="store_true",
+        help="Лише скомпілювати Java і оновити папку Release, без меню",
+    )
+    parser.add_argument(
+        "--zip",
+        action="store_true",
+        help=f"Разом з папкою Release створювати відтворюваний архів {RELEASE_ARCHIVE}",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """Головна функція для запуску процесів."""
-    setup_project_structure()
-
-    if not download_plants_data():
-        log_error("Не вдалося отримати дані")
-        return 1
-
-    if not compile_java_project():
-        log("Продовжую без Java GUI...")
-
-    print("   1. Аналіз топ родин (tasks/top_families.py)")
-    print("   2. Пошук небезпечних рослин для тварин (tasks/search_animals.py)")
-    print("   3. Статистика рівнів небезпеки (tasks/severity_stats.py)")
-    print("   4. Пошук рослин за симптомом (tasks/search_symptoms.py)")
-    print("   5. Перша допомога при отруєнні (tasks/first_aid.py)")
-    print("   6. Пошук безпечних альтернатив (tasks/safe_alternatives.py)")
-    print("   7. Запуск Java GUI (PlantGuide)")
-    print("   8. Створити папку Release")
-
-    choice = input("\nОберіть дію (1-6) або Enter для завершення: ")
-
-    if choice == "1":
-        subprocess.run(
-            [sys.executable, "tasks/top_families.py"]
-        )  # Запуск скрипту топ родин
-    elif choice == "2":
-        animal = input("Введіть назву тварини: ")
-        subprocess.run(
-            [sys.executable, "tasks/search_animals.py", animal]
-        )  # Запуск скрипту пошуку рослин для тварин
-    elif choice == "3":
-        subprocess.run(
-            [sys.executable, "tasks/severity_stats.py"]
-        )  # Запуск скрипту статистики рівнів небезпеки
-    elif choice == "4":
-        subprocess.run(
-            [sys.executable, "tasks/search_symptoms.py"]
-        )  # Запуск скрипту пошуку за симптомом
-    elif choice == "5":
-        subprocess.run(
-            [sys.executable, "tasks/first_aid.py"]
-        )  # Запуск скрипту першої допомоги
-    elif choice == "6":
-        subprocess.run(
-            [sys.executable, "tasks/safe_alternatives.py"]
-        )  # Запуск скрипту пошуку безпечних альтернатив
-    elif choice == "7":
-        if Path("PlantGuide.class").exists():
-            log("Запуск Java GUI...")
-            subprocess.run(["java", "PlantGuide", "plants.json"])
+    args = parse_args(argv)
+    if args.release:
+        compile_java_project()
+        return 0 if create_release_folder(archive=args.zip) else 1
+
+    timeline = StartupTimeline()
+    with timeline.stage("setup"):
+        setup_project_structure()
+
+    # Завантаження даних і компіляція Java виконуються паралельно з показом меню
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="startup") as executor:
+        download = timeline.submit(executor, "download", download_plants_data)
+        javac = timeline.submit(executor, "javac", compile_java_project)
+
+        if not os.path.exists(DATA_FILE) and not wait_stage(download, "Очікування завантаження даних..."):
+            report_background(timeline)
+            log_error("Не вдалося отримати дані")
+            return 1
+
+        # Дані завантажуються один раз і спільні для всіх задач цього процесу;
+        # оновлення з фонового завантаження потрапляє в кеш через apply_changeset
+        with timeline.stage("load"):
+            plants = load_plants_data(DATA_FILE)
+        if not plants and wait_stage(download, "Очікування завантаження даних..."):
+            with timeline.stage("load"):
+                plants = load_plants_data(DATA_FILE)
+        if not plants:
+            report_background(timeline)
+            log_error("Не вдалося завантажити дані")
+            return 1
+
+        timeline.report()
+        status = run_menu(args, timeline, download, javac)
+    report_background(timeline)
+    return status
+
+
+def run_menu(args, timeline, download, javac):
+    while True:
+        report_background(timeline)
+        print()
+        print("   1. Аналіз топ родин (tasks/top_families.py)")
+        print("   2. Пошук небезпечних рослин для тварин (tasks/search_animals.py)")
+        print("   3. Статистика рівнів небезпеки (tasks/severity_stats.py)")
+        print("   4. Пошук рослин за симптомом (tasks/search_symptoms.py)")
+        print("   5. Перша допомога при отруєнні (tasks/first_aid.py)")
+        print("   6. Пошук безпечних альтернатив (tasks/safe_alternatives.py)")
+        print("   7. Запуск Java GUI (PlantGuide)")
+        print("   8. Створити папку Release")
+
+        try:
+            choice = input("\nОберіть дію (1-8) або Enter для завершення: ").strip()
+        except EOFError:
+            break
+
+        if not choice:
+            break
+        elif choice == "2":
+            animal = input("Введіть назву тварини: ")
+            run_task(TASK_MENU[choice], [animal], args.subprocess)
+        elif choice in TASK_MENU:
+            run_task(TASK_MENU[choice], [], args.subprocess)
+        elif choice == "7":
+            wait_stage(javac, "Очікування завершення компіляції Java...")
+            if Path("PlantGuide.class").exists():
+                log("Запуск Java GUI...")
+                subprocess.run(["java", "PlantGuide", "plants.json"])
+            else:
+                log_error("Java клас не скомпільовано")
+        elif choice == "8":
+            wait_stage(download, "Очікування завершення оновлення даних...")
+            wait_stage(javac, "Очікування завершення компіляції Java...")
+            create_release_folder(archive=args.zip)
         else:
-            log_error("Java клас не скомпільовано")
-    elif choice == "8":
-        create_release_folder()
+            log_error(f"Невідома дія: {choice}")
+
+    if not (download.done() and javac.done()):
+        log("Очікування завершення фонових етапів...")
     return 0
 
 
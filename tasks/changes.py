@@ -0,0 +1,201 @@
+# tasks/changes.py
+"""
+Інкрементальне оновлення даних.
+
+Кожен запис хешується за pid; при оновленні plants.json нові хеші
+порівнюються з попередніми (plants.hashes.json) і формується набір змін
+added/changed/removed. Набір дописується у журнал plants.changes.jsonl,
+а зареєстровані похідні структури (кеш даних, індекси) застосовують лише
+цю дельту замість повної перебудови.
+"""
+import datetime
+import hashlib
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from log import log, log_error
+
+try:
+    from .utils import cached_plants, store_plants_cache
+except ImportError:
+    from utils import cached_plants, store_plants_cache
+
+
+HASHES_SUFFIX = ".hashes.json"
+CHANGES_SUFFIX = ".changes.jsonl"
+
+# Обробники дельти: (назва, функція(changeset, previous, plants))
+_handlers = []
+
+
+def hashes_path(json_path):
+    """Шлях до файлу з хешами записів для вказаного JSON файлу."""
+    return os.path.splitext(json_path)[0] + HASHES_SUFFIX
+
+
+def changes_path(json_path):
+    """Шлях до журналу змін для вказаного JSON файлу."""
+    return os.path.splitext(json_path)[0] + CHANGES_SUFFIX
+
+
+def record_id(plant):
+    """Ідентифікатор запису: pid, а за його відсутності - наукова назва."""
+    return plant.pid if plant.pid is not None else plant.name
+
+
+def record_digest(plant):
+    """Хеш вмісту канонічного запису."""
+    encoded = json.dumps(plant.to_row(), ensure_ascii=False, separators=(",", ":"))
+    return hashlib.blake2b(encoded.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def record_ids(plants):
+    """Ідентифікатори записів у порядку файлу (повтори отримують суфікс #n)."""
+    ids = []
+    seen = {}
+    for plant in plants:
+        rid = record_id(plant)
+        count = seen.get(rid, 0)
+        seen[rid] = count + 1
+        ids.append(rid if count == 0 else f"{rid}#{count}")
+    return ids
+
+
+def hash_records(plants):
+    """Словник ідентифікатор -> хеш у порядку файлу."""
+    return dict(zip(record_ids(plants), map(record_digest, plants)))
+
+
+def diff_hashes(old_hashes, new_hashes):
+    """Набір змін між двома версіями хешів."""
+    return {
+        "added": [rid for rid in new_hashes if rid not in old_hashes],
+        "changed": [rid for rid, digest in new_hashes.items()
+                    if rid in old_hashes and old_hashes[rid] != digest],
+        "removed": [rid for rid in old_hashes if rid not in new_hashes],
+    }
+
+
+def is_empty(changeset):
+    return not (changeset["added"] or changeset["changed"] or changeset["removed"])
+
+
+def load_hashes(json_path):
+    try:
+        with open(hashes_path(json_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_hashes(json_path, hashes):
+    path = hashes_path(json_path)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(hashes, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def record_changeset(json_path, changeset, total):
+    """Дописує набір змін у журнал для аудиту."""
+    entry = {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "source": os.path.basename(json_path),
+        "total": total,
+    }
+    entry.update(changeset)
+    with open(changes_path(json_path), "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def register_delta_handler(name, handler):
+    """Реєструє обробник дельти для похідної структури.
+
+    handler(changeset, previous, plants) отримує набір змін, попередній
+    закешований список рослин і новий список, що став поточним у кеші.
+    """
+    _handlers[:] = [(n, h) for n, h in _handlers if n != name]
+    _handlers.append((name, handler))
+
+
+def apply_changeset(json_path, plants, persist=True):
+    """Порівнює нову версію даних з попередньою і застосовує дельту.
+
+    Викликається після запису нового json_path. Новий список рослин стає
+    поточним у кеші load_plants_data (незмінені записи беруться з
+    попереднього списку), після чого зареєстровані обробники отримують
+    набір змін. Повертає набір змін; порожній набір означає, що похідні
+    структури залишаються без змін.
+
+    persist=False порівнює з даними в пам'яті процесу (а не з plants.hashes.json)
+    і нічого не записує на диск - для довгоживучих процесів, як демон задач.
+    """
+    previous = cached_plants(json_path)
+    ids = record_ids(plants)
+    new_hashes = dict(zip(ids, map(record_digest, plants)))
+    if persist:
+        old_hashes = load_hashes(json_path)
+    else:
+        old_hashes = hash_records(previous) if previous is not None else None
+    changeset = diff_hashes(old_hashes or {}, new_hashes)
+
+    current = plants
+    if previous is not None:
+        reusable = {rid: plant for rid, plant in zip(record_ids(previous), previous)
+                    if new_hashes.get(rid) == record_digest(plant)}
+        current = [reusable.get(rid, plant) for rid, plant in zip(ids, plants)]
+        if len(current) == len(previous) and all(a is b for a, b in zip(current, previous)):
+            current = previous  # Той самий об'єкт - кешовані індекси лишаються дійсними
+    store_plants_cache(json_path, current)
+
+    if old_hashes is not None and is_empty(changeset):
+        return changeset
+
+    if persist:
+        record_changeset(json_path, changeset, len(plants))
+        save_hashes(json_path, new_hashes)
+
+    if previous is not None and current is not previous:
+        for name, handler in _handlers:
+            try:
+                handler(changeset, previous, current)
+            except Exception as e:
+                log_error(f"Не вдалося застосувати зміни до '{name}': {e}")
+
+    log(f"Зміни даних: +{len(changeset['added'])} ~{len(changeset['changed'])} "
+        f"-{len(changeset['removed'])}")
+    return changeset
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Журнал змін даних plants.json")
+    parser.add_argument("input_file", nargs="?", default="plants.json",
+                        help="JSON файл з даними (за замовчуванням: plants.json)")
+    parser.add_argument("--last", type=int, default=5,
+                        help="Кількість останніх наборів змін (за замовчуванням: 5)")
+
+    args = parser.parse_args()
+
+    try:
+        with open(changes_path(args.input_file), "r", encoding="utf-8") as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+    except OSError:
+        log_error(f"Журнал змін для {args.input_file} не знайдено")
+        return 1
+
+    for entry in entries[-args.last:]:
+        log(f"{entry['timestamp']}: +{len(entry['added'])} ~{len(entry['changed'])} "
+            f"-{len(entry['removed'])} (всього {entry['total']})")
+        for key in ("added", "changed", "removed"):
+            if entry[key]:
+                print(f"    {key}: {', '.join(entry[key][:10])}"
+                      + (f" ... (+{len(entry[key]) - 10})" if len(entry[key]) > 10 else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
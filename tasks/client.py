@@ -0,0 +1,93 @@
+# tasks/client.py
+"""
+Клієнт локального демона задач (tasks/daemon.py).
+
+Якщо демон запущений, CLI задач надсилають йому запит через Unix-сокет
+і отримують готовий результат без повторного завантаження даних.
+Інакше задача виконується локально, як і раніше.
+"""
+import json
+import os
+import socket
+import tempfile
+from stat import S_ISSOCK
+
+try:
+    from .utils import resolve_data_file
+except ImportError:
+    from utils import resolve_data_file
+
+
+def default_socket_path():
+    """Шлях до сокета демона.
+
+    Пріоритет: змінна GREENLEAF_SOCKET, особиста папка XDG_RUNTIME_DIR,
+    тимчасова папка (там сокет перевіряється socket_is_trusted).
+    """
+    path = os.environ.get("GREENLEAF_SOCKET")
+    if path:
+        return path
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir and os.path.isdir(runtime_dir):
+        return os.path.join(runtime_dir, "greenleaf.sock")
+    uid = os.getuid() if hasattr(os, "getuid") else "user"
+    return os.path.join(tempfile.gettempdir(), f"greenleaf-{uid}.sock")
+
+
+def socket_is_trusted(socket_path):
+    """Сокет належить поточному користувачу і недоступний іншим.
+
+    Інакше інший користувач спільної /tmp міг би підмінити демон.
+    """
+    if not hasattr(os, "getuid"):
+        return True
+    try:
+        stat = os.lstat(socket_path)
+    except OSError:
+        return False
+    return (S_ISSOCK(stat.st_mode) and stat.st_uid == os.getuid()
+            and not stat.st_mode & 0o077)
+
+
+def query_daemon(task, params, socket_path=None, timeout=30):
+    """Надсилає запит демону і повертає повну відповідь або None, якщо демон недоступний."""
+    if os.environ.get("GREENLEAF_NO_DAEMON") or not hasattr(socket, "AF_UNIX"):
+        return None
+
+    socket_path = socket_path or default_socket_path()
+    if not socket_is_trusted(socket_path):
+        return None
+
+    params = dict(params)
+    if "input_file" in params:
+        # Демон може працювати з іншої робочої папки
+        data_file = resolve_data_file(params["input_file"])
+        if data_file is not None:
+            params["input_file"] = os.path.abspath(data_file)
+
+    request = json.dumps({"task": task, "params": params}, ensure_ascii=False)
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            sock.sendall(request.encode("utf-8") + b"\n")
+            with sock.makefile("r", encoding="utf-8") as stream:
+                line = stream.readline()
+    except OSError:
+        return None
+
+    if not line:
+        return None
+    try:
+        response = json.loads(line)
+    except ValueError:  # Обірвана або пошкоджена відповідь - виконуємо локально
+        return None
+    return response if isinstance(response, dict) else None
+
+
+def run_task(task, params, local_func):
+    """Виконує задачу через демон, якщо він запущений, інакше локально."""
+    response = query_daemon(task, params)
+    if response is not None and response.get("ok"):
+        return response["result"]
+    return local_func(**params)
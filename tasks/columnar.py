@@ -0,0 +1,353 @@
+# tasks/columnar.py
+"""
+Стовпцеве сховище рослин, що відкривається через mmap.
+
+Файл plants.columns будується з plants.json і містить:
+- таблицю рядків (зміщення + UTF-8 блоб);
+- словникове кодування родин і рівнів небезпеки;
+- бітову маску тварин для кожної рослини;
+- симптоми у форматі CSR (зміщення + значення).
+
+Агрегації та фільтри працюють напряму з масивами, не створюючи словників
+для кожної рослини.
+"""
+import array
+import mmap
+import os
+import struct
+import sys
+import threading
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from log import log, log_error
+
+try:
+    from .snapshot import file_sha256
+    from .utils import load_plants_data, resolve_data_file
+    from .indexes import canonical_animal, drop_cached_indexes
+except ImportError:
+    from snapshot import file_sha256
+    from utils import load_plants_data, resolve_data_file
+    from indexes import canonical_animal, drop_cached_indexes
+
+
+COLUMNS_MAGIC = b"GLCOLS"
+COLUMNS_VERSION = 2
+COLUMNS_SUFFIX = ".columns"
+MISSING = 0xFFFFFFFF
+MAX_ANIMALS = 64
+
+# Секції у фіксованому порядку: (назва, typecode)
+_SECTIONS = (
+    ("str_offsets", "Q"),
+    ("str_blob", "B"),
+    ("name_ids", "I"),
+    ("common_ids", "I"),
+    ("family_codes", "i"),
+    ("family_dict", "I"),
+    ("severity_codes", "i"),
+    ("severity_levels", "i"),
+    ("severity_dict", "I"),
+    ("animal_masks", "Q"),
+    ("animal_dict", "I"),
+    ("animal_offsets", "I"),
+    ("animal_values", "I"),
+    ("symptom_offsets", "I"),
+    ("symptom_values", "I"),
+    ("symptom_dict", "I"),
+)
+
+# magic, версія, розмір JSON, mtime JSON (нс), SHA-256 JSON, кількість рослин
+_HEADER = struct.Struct("<6sHQq32sI")
+# зміщення і кількість елементів секції
+_SECTION = struct.Struct("<QQ")
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def columns_path(json_path):
+    """Шлях до стовпцевого сховища для вказаного JSON файлу."""
+    return os.path.splitext(json_path)[0] + COLUMNS_SUFFIX
+
+
+class _Encoder:
+    """Словникове кодування значень у порядку першої появи."""
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+def build_columns(plants):
+    """Будує масиви стовпців для списку нормалізованих рослин."""
+    strings = _Encoder()
+    strings.code("")
+    families = _Encoder()
+    severities = _Encoder()
+    animals = _Encoder()
+    symptoms = _Encoder()
+
+    def string_id(value):
+        return MISSING if value is None else strings.code(str(value))
+
+    cols = {name: array.array(typecode) for name, typecode in _SECTIONS}
+    cols["animal_offsets"].append(0)
+    cols["symptom_offsets"].append(0)
+
+    for plant in plants:
+        cols["name_ids"].append(string_id(plant.name))
+        cols["common_ids"].append(string_id(plant.common_name))
+
+        cols["family_codes"].append(families.code(plant.family))
+
+        cols["severity_codes"].append(severities.code(plant.severity.label))
+        cols["severity_levels"].append(plant.severity.level)
+
+        mask = 0
+        for animal in plant.animals:
+            bit = animals.code(animal.lower())
+            if bit >= MAX_ANIMALS:
+                raise ValueError(f"Забагато різних тварин (більше {MAX_ANIMALS})")
+            mask |= 1 << bit
+            cols["animal_values"].append(strings.code(animal))
+        cols["animal_masks"].append(mask)
+        cols["animal_offsets"].append(len(cols["animal_values"]))
+
+        for symptom in plant.symptoms:
+            cols["symptom_values"].append(symptoms.code(symptom.name))
+        cols["symptom_offsets"].append(len(cols["symptom_values"]))
+
+    cols["family_dict"].extend(strings.code(v) for v in families.values)
+    cols["severity_dict"].extend(strings.code(v) for v in severities.values)
+    cols["animal_dict"].extend(strings.code(v) for v in animals.values)
+    cols["symptom_dict"].extend(strings.code(v) for v in symptoms.values)
+
+    offset = 0
+    cols["str_offsets"].append(0)
+    for value in strings.values:
+        encoded = value.encode("utf-8")
+        cols["str_blob"].frombytes(encoded)
+        offset += len(encoded)
+        cols["str_offsets"].append(offset)
+
+    return cols
+
+
+def write_columnar_store(json_path, data=None):
+    """Створює сховище для json_path. Повертає шлях до файлу або None."""
+    try:
+        stat = os.stat(json_path)
+        source_hash = file_sha256(json_path)
+
+        if data is None:
+            data = load_plants_data(json_path)
+
+        cols = build_columns(data)
+        if sys.byteorder != "little":
+            for column in cols.values():
+                column.byteswap()
+
+        header = _HEADER.pack(COLUMNS_MAGIC, COLUMNS_VERSION, stat.st_size,
+                              stat.st_mtime_ns, source_hash, len(data))
+        offset = _HEADER.size + _SECTION.size * len(_SECTIONS)
+        table = []
+        for name, _ in _SECTIONS:
+            offset = (offset + 7) & ~7
+            table.append((offset, len(cols[name])))
+            offset += cols[name].itemsize * len(cols[name])
+
+        path = columns_path(json_path)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            for section_offset, count in table:
+                f.write(_SECTION.pack(section_offset, count))
+            for (name, _), (section_offset, _) in zip(_SECTIONS, table):
+                f.write(b"\0" * (section_offset - f.tell()))
+                cols[name].tofile(f)
+        _forget_store(path)  # На Windows відкритий mmap не дає замінити файл
+        os.replace(tmp_path, path)
+        return path
+    except Exception as e:
+        log_error(f"Не вдалося створити стовпцеве сховище: {e}")
+        return None
+
+
+class ColumnarStore:
+    """Відкрите через mmap стовпцеве сховище (лише для читання)."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = view = memoryview(self._mmap)
+
+        (self.magic, self.version, self.source_size, self.source_mtime_ns,
+         self.source_hash, self.plant_count) = _HEADER.unpack_from(view, 0)
+
+        position = _HEADER.size
+        for name, typecode in _SECTIONS:
+            offset, count = _SECTION.unpack_from(view, position)
+            position += _SECTION.size
+            size = array.array(typecode).itemsize
+            setattr(self, name, view[offset:offset + size * count].cast(typecode))
+
+    def close(self):
+        if self._file.closed:
+            return
+        for name, _ in _SECTIONS:
+            getattr(self, name).release()
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __del__(self):
+        # Замінене сховище закривається, коли його відпускає останній читач
+        try:
+            self.close()
+        except (AttributeError, BufferError, ValueError):
+            pass  # Масиви ще експортовані - mmap закриється разом з ними
+
+    def string(self, string_id):
+        """Рядок з таблиці рядків (None для відсутнього значення)."""
+        if string_id == MISSING:
+            return None
+        start, end = self.str_offsets[string_id], self.str_offsets[string_id + 1]
+        return bytes(self.str_blob[start:end]).decode("utf-8")
+
+    def family_counts(self):
+        """Counter непорожніх родин у порядку першої появи."""
+        counts = Counter(self.family_codes)
+        families = ((self.string(self.family_dict[code]), n) for code, n in counts.items())
+        return Counter({family: n for family, n in families if family})
+
+    def severity_counts(self):
+        """Counter міток небезпеки у порядку першої появи."""
+        counts = Counter(self.severity_codes)
+        return Counter({self.string(self.severity_dict[code]): n for code, n in counts.items()})
+
+    def animal_masks_for(self, animals):
+        """Маски бітів для кожної канонічної тварини із запиту."""
+        masks = {animal: 0 for animal in animals}
+        for bit, string_id in enumerate(self.animal_dict):
+            canonical = canonical_animal(self.string(string_id))
+            if canonical in masks:
+                masks[canonical] |= 1 << bit
+        return [masks[animal] for animal in animals]
+
+    def plants_with_animals(self, masks, match="any"):
+        """Індекси рослин, небезпечних для будь-якої (any) або всіх (all) тварин."""
+        if not masks or (match == "all" and not all(masks)):
+            return []
+        if match == "all":
+            return [i for i, plant_mask in enumerate(self.animal_masks)
+                    if all(plant_mask & mask for mask in masks)]
+        union = 0
+        for mask in masks:
+            union |= mask
+        if not union:
+            return []
+        return [i for i, plant_mask in enumerate(self.animal_masks) if plant_mask & union]
+
+    def plant_animals(self, index):
+        start, end = self.animal_offsets[index], self.animal_offsets[index + 1]
+        return [self.string(self.animal_values[i]) for i in range(start, end)]
+
+    def plant_symptoms(self, index):
+        start, end = self.symptom_offsets[index], self.symptom_offsets[index + 1]
+        return [self.string(self.symptom_dict[self.symptom_values[i]]) for i in range(start, end)]
+
+    def plant_family(self, index):
+        return self.string(self.family_dict[self.family_codes[index]])
+
+    def plant_severity(self, index):
+        return self.string(self.severity_dict[self.severity_codes[index]])
+
+
+def _is_fresh(store, json_path):
+    if store.magic != COLUMNS_MAGIC or store.version != COLUMNS_VERSION:
+        return False
+    stat = os.stat(json_path)
+    if stat.st_size != store.source_size:
+        return False
+    return stat.st_mtime_ns == store.source_mtime_ns or file_sha256(json_path) == store.source_hash
+
+
+def _forget_store(path):
+    """Прибирає сховище з кешу процесу; воно закриється після останнього читача."""
+    with _stores_lock:
+        cached = _stores.pop(os.path.realpath(path), None)
+    if cached is not None:
+        drop_cached_indexes(cached[1])
+
+
+def open_columnar_store(json_path):
+    """Відкриває актуальне сховище для json_path або повертає None.
+
+    Відкриті сховища кешуються на рівні процесу, доки JSON не зміниться;
+    замінене сховище закривається, щойно на нього не лишається посилань.
+    """
+    json_path = resolve_data_file(json_path)
+    if json_path is None or sys.byteorder != "little":
+        return None
+
+    path = columns_path(json_path)
+    try:
+        stat = os.stat(json_path)
+        key = os.path.realpath(path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+
+        with _stores_lock:
+            cached = _stores.get(key)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+            if cached is not None:
+                # Застаріле сховище закриється в __del__, коли його відпустять читачі
+                del _stores[key]
+                drop_cached_indexes(cached[1])
+
+            if not os.path.exists(path):
+                return None
+            store = ColumnarStore(path)
+            if not _is_fresh(store, json_path):
+                store.close()
+                return None
+            _stores[key] = (signature, store)
+            return store
+    except Exception as e:
+        log_error(f"Не вдалося відкрити стовпцеве сховище: {e}")
+        return None
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Створення стовпцевого сховища з plants.json")
+    parser.add_argument("input_file", nargs="?", default="plants.json",
+                        help="JSON файл з даними (за замовчуванням: plants.json)")
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input_file):
+        log_error(f"Файл {args.input_file} не знайдено")
+        return 1
+
+    path = write_columnar_store(args.input_file)
+    if path is None:
+        return 1
+
+    log(f"Сховище збережено у {path} ({os.path.getsize(path) / 1024:.1f} KB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
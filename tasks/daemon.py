@@ -0,0 +1,203 @@
+# tasks/daemon.py
+"""
+Локальний демон задач.
+
+Завантажує дані один раз і відповідає на запити у форматі JSON-lines
+через Unix-сокет. Кожен рядок запиту: {"id": ..., "task": ..., "params": {...}},
+кожен рядок відповіді: {"id": ..., "ok": ..., "result"|"error": ..., "latency_ms": ...}.
+"""
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from log import log, log_error
+
+try:
+    from .utils import load_plants_data, log_protocol, enable_metrics, metrics_snapshot, metrics_prometheus
+    from .client import default_socket_path, query_daemon, socket_is_trusted
+    from .changes import apply_changeset
+    from .columnar import open_columnar_store
+    from .top_families import analyze_top_families
+    from .search_animals import search_dangerous_plants_for_animal
+    from .severity_stats import analyze_severity_statistics
+    from .search_symptoms import search_plants_by_symptom
+    from .first_aid import get_first_aid_info
+    from .safe_alternatives import find_safe_alternatives
+    from .groupby import group_by
+except ImportError:
+    from utils import load_plants_data, log_protocol, enable_metrics, metrics_snapshot, metrics_prometheus
+    from client import default_socket_path, query_daemon, socket_is_trusted
+    from changes import apply_changeset
+    from columnar import open_columnar_store
+    from top_families import analyze_top_families
+    from search_animals import search_dangerous_plants_for_animal
+    from severity_stats import analyze_severity_statistics
+    from search_symptoms import search_plants_by_symptom
+    from first_aid import get_first_aid_info
+    from safe_alternatives import find_safe_alternatives
+    from groupby import group_by
+
+
+def ping():
+    return {"status": "ok"}
+
+
+def reload(input_file="plants.json"):
+    """Перечитує оновлений файл даних і застосовує до індексів лише дельту."""
+    plants = load_plants_data(input_file, use_cache=False)
+    if not plants:
+        raise ValueError("Не вдалося завантажити дані")
+    changeset = apply_changeset(input_file, plants, persist=False)
+    open_columnar_store(input_file)
+    return {key: len(value) for key, value in changeset.items()}
+
+
+def metrics():
+    """Метрики задач демона (збір вмикається --metrics або GREENLEAF_METRICS)."""
+    snapshot = metrics_snapshot()
+    return {"metrics": snapshot, "prometheus": metrics_prometheus(snapshot)}
+
+
+TASKS = {
+    "ping": ping,
+    "reload": reload,
+    "metrics": metrics,
+    "top_families": analyze_top_families,
+    "search_animals": search_dangerous_plants_for_animal,
+    "severity_stats": analyze_severity_statistics,
+    "search_symptoms": search_plants_by_symptom,
+    "first_aid": get_first_aid_info,
+    "safe_alternatives": find_safe_alternatives,
+    "group_by": group_by,
+}
+
+
+def handle_request(request):
+    """Виконує один запит і повертає відповідь з часом обробки."""
+    start = time.perf_counter()
+    response = {"id": request.get("id") if isinstance(request, dict) else None}
+
+    try:
+        if not isinstance(request, dict):
+            raise ValueError("Запит має бути JSON об'єктом")
+        task = request.get("task")
+        if task not in TASKS:
+            raise ValueError(f"Невідома задача: {task}")
+        params = request.get("params") or {}
+        if params.get("lazy"):
+            # Ітератор не передається через сокет; клієнт виконає такий запит локально
+            raise ValueError("Параметр lazy не підтримується демоном")
+        response["result"] = TASKS[task](**params)
+        response["ok"] = True
+    except Exception as e:
+        response["ok"] = False
+        response["error"] = str(e)
+
+    response["latency_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    return response
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Обробляє з'єднання: один запит на рядок, одна відповідь на рядок."""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                response = {"id": None, "ok": False, "error": f"Некоректний JSON: {e}",
+                            "latency_ms": 0.0}
+            else:
+                response = handle_request(request)
+
+            try:
+                payload = json.dumps(response, ensure_ascii=False) + "\n"
+            except (TypeError, ValueError) as e:
+                payload = json.dumps({"id": response.get("id"), "ok": False,
+                                      "error": f"Результат не серіалізується в JSON: {e}",
+                                      "latency_ms": response.get("latency_ms", 0.0)},
+                                     ensure_ascii=False, default=str) + "\n"
+            self.wfile.write(payload.encode("utf-8"))
+            self.wfile.flush()
+
+
+class TaskServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    # Черга очікуючих з'єднань для багатьох одночасних клієнтів
+    request_queue_size = 128
+
+
+def serve(socket_path=None, input_file="plants.json"):
+    """Запускає демон і блокується до зупинки."""
+    socket_path = socket_path or default_socket_path()
+
+    if os.path.exists(socket_path):
+        if not socket_is_trusted(socket_path):
+            log_error(f"{socket_path} належить іншому користувачу або доступний іншим - демон не запущено")
+            return 1
+        if query_daemon("ping", {}, socket_path=socket_path, timeout=1) is not None:
+            log_error(f"Демон уже працює на {socket_path}")
+            return 1
+        os.unlink(socket_path)  # Сокет від попереднього процесу, що завершився аварійно
+
+    plants = load_plants_data(input_file)
+    if not plants:
+        log_error("Не вдалося завантажити дані")
+        return 1
+    open_columnar_store(input_file)
+
+    # Сокет одразу створюється з правами 0600: між bind і chmod до нього
+    # міг би під'єднатися інший користувач
+    previous_umask = os.umask(0o077)
+    try:
+        server = TaskServer(socket_path, RequestHandler)
+    finally:
+        os.umask(previous_umask)
+    os.chmod(socket_path, 0o600)  # Друга лінія захисту
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    log(f"Демон задач слухає {socket_path} ({len(plants)} рослин у пам'яті)")
+    log_protocol(f"Демон задач запущено: {socket_path}")
+    try:
+        server.serve_forever()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        log("Демон задач зупинено")
+    return 0
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Локальний демон аналітичних задач")
+    parser.add_argument("--socket", default=None,
+                        help="Шлях до Unix-сокета (за замовчуванням: GREENLEAF_SOCKET, XDG_RUNTIME_DIR або тимчасова папка)")
+    parser.add_argument("--input", default="plants.json",
+                        help="JSON файл з даними для попереднього завантаження")
+    parser.add_argument("--metrics", metavar="FILE", default=None,
+                        help="Збирати метрики задач і зберегти їх у JSON файл при зупинці")
+
+    args = parser.parse_args()
+    if args.metrics:
+        enable_metrics(args.metrics)
+
+    if not hasattr(socket, "AF_UNIX"):
+        log_error("Unix-сокети не підтримуються на цій платформі")
+        return 1
+
+    return serve(args.socket, args.input)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,9 +7,17 @@ import sys
 import os
 
 try:
-    from .utils import load_plants_data, save_results, log_protocol
+    from .utils import load_plants_data, save_results, log_protocol, run_batch
+    from .utils import instrumented, timed, count_records, enable_metrics
+    from .result_cache import cached_result
+    from .indexes import resolve_plant
+    from .client import run_task
 except ImportError:
-    from utils import load_plants_data, save_results, log_protocol
+    from utils import load_plants_data, save_results, log_protocol, run_batch
+    from utils import instrumented, timed, count_records, enable_metrics
+    from result_cache import cached_result
+    from indexes import resolve_plant
+    from client import run_task
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from log import log, log_error
@@ -36,46 +44,29 @@ EMERGENCY_INFO = """
 """
 
 
+@instrumented("first_aid")
+@cached_result("first_aid")
 def get_first_aid_info(plant_name, input_file="plants.json"):
     """Отримує інформацію про першу допомогу при отруєнні рослиною."""
-    plants_db = load_plants_data(input_file)
+    with timed("load"):
+        plants_db = load_plants_data(input_file)
     if not plants_db:
         return {"error": "Не вдалося завантажити базу даних"}
 
-    plant_name_lower = plant_name.lower().strip()
-    found_plant = None
-
-    for plant in plants_db:
-        if plant_name_lower in plant.get("name", "").lower():
-            found_plant = plant
-            break
-
-        for common in plant.get("common", []):
-            common_name = (
-                common.get("name", "") if isinstance(common, dict) else str(common)
-            )
-            if plant_name_lower in common_name.lower():
-                found_plant = plant
-                break
-        if found_plant:
-            break
+    found_plant, candidates = resolve_plant(plants_db, plant_name)
+    count_records("scanned", len(plants_db))
+    count_records("matched", 1 if found_plant else 0)
 
     if not found_plant:
         return {"error": f"Рослина '{plant_name}' не знайдена в базі даних"}
 
-    severity = found_plant.get("severity", {})
-    if isinstance(severity, dict):
-        sev_label = severity.get("label", "Unknown")
-        sev_level = severity.get("level", 0)
-    else:
-        sev_label = str(severity)
-        sev_level = 2
+    sev_label, sev_level = found_plant.severity
 
     symptoms = []
     first_aid_actions = []
 
-    for s in found_plant.get("symptoms", []):
-        symptom_name = s.get("name", "") if isinstance(s, dict) else str(s)
+    for s in found_plant.symptoms:
+        symptom_name = s.name
         symptoms.append(symptom_name)
 
         for key, tip in FIRST_AID_TIPS.items():
@@ -90,23 +81,17 @@ def get_first_aid_info(plant_name, input_file="plants.json"):
     else:
         urgency = "ПОМІРНА - спостерігайте за станом тварини"
 
-    animals = []
-    for a in found_plant.get("animals", []):
-        if isinstance(a, dict):
-            animals.append(str(list(a.values())[0]))
-        else:
-            animals.append(str(a))
-
     result = {
         "task": "first_aid",
         "timestamp": __import__("datetime").datetime.now().isoformat(),
         "plant_query": plant_name,
+        "candidates": candidates,
         "plant": {
-            "scientific_name": found_plant.get("name", ""),
-            "family": found_plant.get("family", ""),
+            "scientific_name": found_plant.name,
+            "family": found_plant.family,
             "severity": sev_label,
             "severity_level": sev_level,
-            "affected_animals": animals,
+            "affected_animals": list(found_plant.animals),
         },
         "symptoms": symptoms,
         "urgency": urgency,
@@ -114,11 +99,11 @@ def get_first_aid_info(plant_name, input_file="plants.json"):
         "emergency_info": EMERGENCY_INFO,
     }
 
-    log_protocol(f"Перша допомога: запит про {found_plant.get('name', plant_name)}")
+    log_protocol(f"Перша допомога: запит про {found_plant.name}")
     return result
 
 
-def main():
+def main(argv=None):
     import argparse
 
     parser = argparse.ArgumentParser(description="Перша допомога при отруєнні рослиною")
@@ -127,8 +112,31 @@ def main():
     parser.add_argument(
         "--output", default="results_first_aid.json", help="Файл результатів"
     )
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="JSONL файл із запитами (один JSON об'єкт з аргументами на рядок)",
+    )
+    parser.add_argument(
+        "--batch-output",
+        default="-",
+        help="Файл для JSONL результатів пакетного режиму (за замовчуванням: stdout)",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="Зберегти метрики фаз задачі у JSON файл (і .prom поруч)",
+    )
+
+    args = parser.parse_args(argv)
+    if args.metrics:
+        enable_metrics(args.metrics)
 
-    args = parser.parse_args()
+    if args.batch:
+        stats = run_batch(
+            args.batch, get_first_aid_info, args.batch_output, {"input_file": args.input}
+        )
+        return 0 if stats["errors"] == 0 else 1
 
     if not args.plant:
         print("\n" + "=" * 60)
@@ -142,14 +150,20 @@ def main():
         log_error("Назва рослини не вказана")
         return 1
 
-    results = get_first_aid_info(args.plant, args.input)
+    results = run_task(
+        "first_aid",
+        {"plant_name": args.plant, "input_file": args.input},
+        get_first_aid_info,
+    )
 
     if "error" in results:
         log_error(results["error"])
         print("\nСпробуйте ввести іншу назву або перевірте правопис.")
         return 1
 
-    if save_results(results, args.output):
+    with timed("serialize", "first_aid"):
+        saved = save_results(results, args.output)
+    if saved:
         log(f"Результати збережено у {args.output}")
 
     plant = results["plant"]
@@ -159,6 +173,12 @@ def main():
     print("!" * 60)
 
     print(f"\nРослина: {plant['scientific_name']}")
+    candidates = results.get("candidates", [])
+    if candidates and candidates[0]["fuzzy"]:
+        print(f"Можливо, ви мали на увазі: {candidates[0]['matched']}")
+    others = [c["scientific_name"] for c in candidates[1:]]
+    if others:
+        print(f"Інші збіги: {', '.join(others)}")
     print(f"Родина: {plant['family']}")
     print(f"Рівень небезпеки: {plant['severity']}")
 
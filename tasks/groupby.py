@@ -0,0 +1,301 @@
+# tasks/groupby.py
+"""
+Групування і перехресні таблиці за атрибутами рослин на NumPy.
+
+Атрибути зберігаються словниково закодованими масивами цілих чисел:
+- family, severity - один код на рослину;
+- animal, symptom - кілька кодів на рослину у форматі CSR (зміщення + значення).
+
+Групування за довільним набором атрибутів розгортає багатозначні атрибути
+в пари (рослина, значення), перетворює коди на плоский індекс комірки
+(np.ravel_multi_index) і рахує всі комірки одним np.bincount. Для
+стовпцевого сховища масиви беруться з mmap без копіювання.
+
+NumPy необов'язковий: без нього plant_frame повертає None, а задачі
+рахують звичайними циклами.
+"""
+import os
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from log import log, log_error
+
+try:
+    from .utils import load_plants_data, save_results, log_protocol
+    from .utils import instrumented, timed, count_records, enable_metrics
+    from .result_cache import cached_result
+    from .columnar import MISSING, ColumnarStore, build_columns, open_columnar_store
+    from .indexes import cached_index, canonical_animal
+except ImportError:
+    from utils import load_plants_data, save_results, log_protocol
+    from utils import instrumented, timed, count_records, enable_metrics
+    from result_cache import cached_result
+    from columnar import MISSING, ColumnarStore, build_columns, open_columnar_store
+    from indexes import cached_index, canonical_animal
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+DIMENSIONS = ("family", "severity", "animal", "symptom")
+
+
+class _Dimension:
+    """Закодований атрибут: labels[code]; codes - по одному на рослину,
+    або offsets/values - кілька на рослину."""
+
+    def __init__(self, labels, codes=None, offsets=None, values=None):
+        self.labels = labels
+        self.codes = codes
+        self.offsets = offsets
+        self.values = values
+
+
+class PlantFrame:
+    """Закодовані атрибути рослин для векторизованих агрегацій."""
+
+    def __init__(self, size, columns, string):
+        self.size = size
+        self._columns = columns
+        self._string = string
+        self._dimensions = {}
+
+    @classmethod
+    def from_store(cls, store):
+        """Кадр поверх відкритого стовпцевого сховища (без копіювання масивів)."""
+        return cls(store.plant_count, store, store.string)
+
+    @classmethod
+    def from_plants(cls, plants):
+        """Кадр для списку нормалізованих рослин."""
+        cols = build_columns(plants)
+        blob = cols["str_blob"].tobytes()
+        offsets = cols["str_offsets"]
+        strings = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+
+        def string(string_id):
+            return None if string_id == MISSING else strings[string_id]
+
+        return cls(len(plants), cols, string)
+
+    def _column(self, name, dtype):
+        if isinstance(self._columns, ColumnarStore):
+            column = getattr(self._columns, name)
+        else:
+            column = self._columns[name]
+        return np.frombuffer(column, dtype=dtype)
+
+    def dimension(self, name):
+        """Закодований атрибут name (будується при першому зверненні)."""
+        dimension = self._dimensions.get(name)
+        if dimension is not None:
+            return dimension
+        if name not in DIMENSIONS:
+            raise ValueError(f"Невідомий атрибут: {name} (доступні: {', '.join(DIMENSIONS)})")
+
+        if name in ("family", "severity"):
+            labels = [self._string(i) for i in self._column(f"{name}_dict", np.uint32)]
+            dimension = _Dimension(labels, codes=self._column(f"{name}_codes", np.int32))
+        elif name == "symptom":
+            labels = [self._string(i) for i in self._column("symptom_dict", np.uint32)]
+            dimension = self._multi(self._column("symptom_offsets", np.uint32),
+                                    self._column("symptom_values", np.uint32), labels)
+        else:
+            # Значення - ідентифікатори рядків; синоніми зводяться до канонічної тварини
+            string_ids, values = np.unique(self._column("animal_values", np.uint32), return_inverse=True)
+            canonical = {}
+            mapping = np.array([canonical.setdefault(canonical_animal(self._string(i)), len(canonical))
+                                for i in string_ids], dtype=np.int64)
+            dimension = self._multi(self._column("animal_offsets", np.uint32),
+                                    mapping[values.ravel()], list(canonical))
+        self._dimensions[name] = dimension
+        return dimension
+
+    def _multi(self, offsets, values, labels):
+        """CSR атрибут без повторів значення в межах однієї рослини."""
+        offsets = offsets.astype(np.int64)
+        sizes = np.diff(offsets)
+        rows = np.repeat(np.arange(self.size, dtype=np.int64), sizes)
+        pairs = np.unique(rows * max(len(labels), 1) + values.astype(np.int64))
+        rows, values = np.divmod(pairs, max(len(labels), 1))
+        offsets = np.zeros(self.size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=self.size), out=offsets[1:])
+        return _Dimension(labels, offsets=offsets, values=values)
+
+    def counts(self, *dimensions, mask=None):
+        """Кількість рослин у кожній комбінації значень атрибутів.
+
+        Повертає (масив форми [len(labels) для кожного атрибута], [labels, ...]).
+        Рослина з кількома значеннями багатозначного атрибута входить у кожну
+        свою комбінацію. mask - необов'язковий булевий масив відбору рослин.
+        """
+        if not dimensions:
+            raise ValueError("Потрібен хоча б один атрибут")
+        dims = [self.dimension(name) for name in dimensions]
+        rows = np.arange(self.size, dtype=np.int64) if mask is None else np.flatnonzero(mask)
+        codes = []
+        for dim in dims:
+            if dim.codes is not None:
+                codes.append(dim.codes[rows])
+                continue
+            # Розгортання: кожна поточна комбінація повторюється для кожного значення рослини
+            starts = dim.offsets[rows]
+            sizes = dim.offsets[rows + 1] - starts
+            shift = starts - (np.cumsum(sizes) - sizes)
+            positions = np.arange(int(sizes.sum()), dtype=np.int64) + np.repeat(shift, sizes)
+            codes = [column.repeat(sizes) for column in codes]
+            codes.append(dim.values[positions])
+            rows = rows.repeat(sizes)
+
+        shape = tuple(len(dim.labels) for dim in dims)
+        if not all(shape):
+            return np.zeros(shape, dtype=np.int64), [dim.labels for dim in dims]
+        flat = np.ravel_multi_index(codes, shape)
+        table = np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+        return table, [dim.labels for dim in dims]
+
+    def value_counts(self, name, drop_empty=True):
+        """Counter значень атрибута у порядку кодів (першої появи)."""
+        table, (labels,) = self.counts(name)
+        return Counter({labels[code]: int(table[code]) for code in np.flatnonzero(table)
+                        if labels[code] or not drop_empty})
+
+    def group_counts(self, dimensions, limit=None, drop_empty=True):
+        """Непорожні групи за спаданням кількості: [{атрибут: значення, ..., "count", "percentage"}]."""
+        table, labels = self.counts(*dimensions)
+        cells = np.flatnonzero(table)
+        if drop_empty:
+            keep = np.ones(len(cells), dtype=bool)
+            for names, codes in zip(labels, np.unravel_index(cells, table.shape)):
+                keep &= np.array([bool(name) for name in names], dtype=bool)[codes]
+            cells = cells[keep]
+        values = table.ravel()[cells]
+        # Стабільне сортування: рівні кількості - у порядку першої появи значень
+        order = np.argsort(-values, kind="stable")[:limit]
+        groups = []
+        for cell, count in zip(cells[order], values[order]):
+            group = {name: names[code] for name, names, code
+                     in zip(dimensions, labels, np.unravel_index(cell, table.shape))}
+            group["count"] = int(count)
+            group["percentage"] = round(int(count) / self.size * 100, 2) if self.size else 0.0
+            groups.append(group)
+        return groups
+
+    def crosstab(self, rows, columns, drop_empty=True):
+        """Перехресна таблиця rows x columns з частками від кількості рослин у рядку."""
+        table, (row_labels, column_labels) = self.counts(rows, columns)
+        row_totals, _ = self.counts(rows)
+        row_keep = [i for i, label in enumerate(row_labels) if row_totals[i] and (label or not drop_empty)]
+        column_keep = [j for j, label in enumerate(column_labels)
+                       if table[:, j].any() and (label or not drop_empty)]
+        table = table[np.ix_(row_keep, column_keep)] if row_keep and column_keep else np.zeros((0, 0), dtype=np.int64)
+        totals = row_totals[row_keep]
+        percentages = np.round(table / np.maximum(totals, 1)[:, None] * 100, 2)
+        return {
+            "rows": rows,
+            "columns": columns,
+            "row_labels": [row_labels[i] for i in row_keep],
+            "column_labels": [column_labels[j] for j in column_keep],
+            "row_totals": totals.tolist(),
+            "counts": table.tolist(),
+            "percentages": percentages.tolist(),
+        }
+
+
+def numpy_available():
+    return np is not None
+
+
+def plant_frame(data):
+    """Кадр для стовпцевого сховища або списку рослин; None без NumPy."""
+    if np is None or data is None:
+        return None
+    if isinstance(data, ColumnarStore):
+        return cached_index("frame", data, PlantFrame.from_store)
+    return cached_index("frame", data, PlantFrame.from_plants)
+
+
+@instrumented("group_by")
+@cached_result("group_by")
+def group_by(dimensions, input_file="plants.json", limit=None, drop_empty=True):
+    """Кількість рослин за комбінаціями атрибутів; для двох атрибутів - ще й перехресна таблиця."""
+    if np is None:
+        return {"error": "Для групування потрібен NumPy (pip install numpy)"}
+    dimensions = list(dimensions)
+    unknown = [name for name in dimensions if name not in DIMENSIONS]
+    if not dimensions or unknown:
+        return {"error": f"Невідомі атрибути: {', '.join(unknown) or '-'} (доступні: {', '.join(DIMENSIONS)})"}
+
+    with timed("load"):
+        store = open_columnar_store(input_file)
+        data = store if store is not None and store.plant_count else load_plants_data(input_file)
+    if not data:
+        return {"error": "Не вдалося завантажити дані"}
+
+    with timed("index"):
+        frame = plant_frame(data)
+    count_records("scanned", frame.size)
+    groups = frame.group_counts(dimensions, limit, drop_empty)
+    count_records("matched", len(groups))
+
+    result = {
+        "task": "group_by",
+        "timestamp": __import__('datetime').datetime.now().isoformat(),
+        "total_plants": frame.size,
+        "dimensions": dimensions,
+        "groups": groups,
+    }
+    if len(dimensions) == 2:
+        result["crosstab"] = frame.crosstab(dimensions[0], dimensions[1], drop_empty)
+
+    log_protocol(f"Групування за {' x '.join(dimensions)}: {len(groups)} груп")
+    return result
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Групування рослин за атрибутами і перехресні таблиці")
+    parser.add_argument("dimensions", nargs="+", choices=DIMENSIONS,
+                        help="Атрибути групування (два атрибути - ще й перехресна таблиця)")
+    parser.add_argument("--input", dest="input_file", default="plants.json",
+                        help="JSON файл з даними (за замовчуванням: plants.json)")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="Кількість найбільших груп у результаті (за замовчуванням: усі)")
+    parser.add_argument("--keep-empty", action="store_true",
+                        help="Не відкидати рослини з порожнім значенням атрибута")
+    parser.add_argument("--output", default="results_group_by.json",
+                        help="Файл для збереження результатів")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="Зберегти метрики фаз задачі у JSON файл (і .prom поруч)")
+
+    args = parser.parse_args(argv)
+    if args.metrics:
+        enable_metrics(args.metrics)
+
+    results = group_by(args.dimensions, args.input_file, args.limit, not args.keep_empty)
+    if "error" in results:
+        log_error(results["error"])
+        return 1
+
+    with timed("serialize", "group_by"):
+        saved = save_results(results, args.output)
+    if not saved:
+        log_error("Помилка збереження результатів")
+        return 1
+
+    log(f"Результати збережено у {args.output}")
+    log(f"Групування за {' x '.join(args.dimensions)} ({results['total_plants']} рослин):")
+    for group in results["groups"][:20]:
+        values = " / ".join(str(group[name]) for name in args.dimensions)
+        print(f"    {values} - {group['count']} ({group['percentage']}%)")
+    if len(results["groups"]) > 20:
+        print(f"    ... ще {len(results['groups']) - 20} груп")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
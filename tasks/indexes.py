@@ -0,0 +1,564 @@
+# tasks/indexes.py
+"""
+Індекси для пошукових задач.
+
+Індекси будуються один раз для завантаженого списку рослин і кешуються,
+доки load_plants_data повертає той самий об'єкт.
+"""
+import bisect
+import gc
+import os
+import re
+import threading
+from collections import Counter
+
+try:
+    from .changes import record_ids, register_delta_handler
+except ImportError:
+    from changes import record_ids, register_delta_handler
+
+
+# Канонічні назви тварин і їхні синоніми
+ANIMAL_ALIASES = {
+    "dogs": ("dog", "puppy", "puppies", "canine", "canines", "собака", "собаки", "пес"),
+    "cats": ("cat", "kitten", "kittens", "feline", "felines", "кіт", "коти", "кішка"),
+    "horses": ("horse", "pony", "ponies", "equine", "equines", "кінь", "коні"),
+    "birds": ("bird", "parrot", "parrots", "budgie", "canary", "птах", "птахи"),
+    "reptiles": ("reptile", "lizard", "lizards", "snake", "snakes", "turtle",
+                 "turtles", "tortoise", "рептилія", "рептилії"),
+    "small-mammals": ("small mammals", "small mammal", "small-mammal", "rabbit",
+                      "rabbits", "hamster", "hamsters", "guinea pig", "guinea pigs",
+                      "rodent", "rodents", "ferret", "ferrets", "гризуни"),
+    "fish": ("fishes", "риба", "риби"),
+}
+
+_ALIAS_TO_ANIMAL = {
+    alias: canonical
+    for canonical, aliases in ANIMAL_ALIASES.items()
+    for alias in (canonical,) + aliases
+}
+
+_index_cache = {}
+_index_cache_lock = threading.Lock()
+
+
+def canonical_animal(name):
+    """Канонічна назва тварини; невідомі назви повертаються нормалізованими."""
+    normalized = " ".join(str(name).lower().replace("_", " ").split())
+    return _ALIAS_TO_ANIMAL.get(normalized, normalized.replace(" ", "-"))
+
+
+def is_known_animal(name):
+    return canonical_animal(name) in ANIMAL_ALIASES
+
+
+def bitset_to_indices(bits):
+    """Перетворює бітову множину (int) на відсортований список індексів."""
+    indices = []
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for byte_index, byte in enumerate(data):
+        if byte:
+            base = byte_index * 8
+            indices.extend(base + bit for bit in range(8) if byte >> bit & 1)
+    return indices
+
+
+def indices_to_bitset(indices, size):
+    """Будує бітову множину (int) з індексів за один прохід."""
+    data = bytearray((size + 7) // 8)
+    for index in indices:
+        data[index >> 3] |= 1 << (index & 7)
+    return int.from_bytes(data, "little")
+
+
+def cached_index(kind, plants, builder):
+    """Повертає індекс kind для plants, будуючи його лише один раз."""
+    key = (kind, id(plants))
+    with _index_cache_lock:
+        cached = _index_cache.get(key)
+        if cached is not None and cached[0] is plants:
+            return cached[1]
+
+    index = builder(plants)
+    with _index_cache_lock:
+        # Індекси для застарілих версій даних більше не потрібні
+        for stale in [k for k in _index_cache if k[0] == kind]:
+            del _index_cache[stale]
+        _index_cache[key] = (plants, index)
+    return index
+
+
+def drop_cached_indexes(indexed):
+    """Забуває індекси, побудовані для indexed (наприклад, закритого сховища)."""
+    with _index_cache_lock:
+        for key in [k for k, (obj, _) in _index_cache.items() if obj is indexed]:
+            del _index_cache[key]
+
+
+def apply_index_delta(changeset, previous, plants):
+    """Переносить індекси з попередньої версії даних на нову.
+
+    Якщо позиції наявних записів не змінилися (лише зміни на місці та нові
+    записи в кінці), індекси з методом apply_delta оновлюються тільки для
+    змінених позицій; решта індексів відкидається і будується заново за потреби.
+    """
+    old_ids = record_ids(previous)
+    new_ids = record_ids(plants)
+    positions = None
+    if new_ids[:len(old_ids)] == old_ids:
+        fresh = set(changeset["added"]) | set(changeset["changed"])
+        positions = [i for i, rid in enumerate(new_ids) if rid in fresh]
+
+    with _index_cache_lock:
+        for key, (indexed, index) in list(_index_cache.items()):
+            if indexed is not previous:
+                continue
+            del _index_cache[key]
+            if positions is not None and hasattr(index, "apply_delta"):
+                _index_cache[(key[0], id(plants))] = (plants, index.apply_delta(plants, positions))
+
+
+register_delta_handler("indexes", apply_index_delta)
+
+
+class AnimalIndex:
+    """Інвертований індекс: канонічна тварина -> бітова множина рослин."""
+
+    def __init__(self, plants):
+        self.size = len(plants)
+        postings = {}
+        for position, plant in enumerate(plants):
+            for animal in plant.animals:
+                canonical = canonical_animal(animal)
+                postings.setdefault(canonical, []).append(position)
+
+        self.postings = {
+            animal: indices_to_bitset(indices, self.size)
+            for animal, indices in postings.items()
+        }
+
+    def apply_delta(self, plants, positions):
+        """Новий індекс для plants, де перераховано лише вказані позиції."""
+        index = AnimalIndex.__new__(AnimalIndex)
+        index.size = len(plants)
+        stale = ~indices_to_bitset(positions, index.size)
+        index.postings = {animal: bits & stale for animal, bits in self.postings.items()}
+
+        added = {}
+        for position in positions:
+            for animal in plants[position].animals:
+                added.setdefault(canonical_animal(animal), []).append(position)
+        for animal, indices in added.items():
+            index.postings[animal] = index.postings.get(animal, 0) | indices_to_bitset(indices, index.size)
+
+        index.postings = {animal: bits for animal, bits in index.postings.items() if bits}
+        return index
+
+    def bitset(self, animals, match="any"):
+        """Бітова множина рослин для тварин: об'єднання (any) або перетин (all)."""
+        sets = [self.postings.get(canonical_animal(animal), 0) for animal in animals]
+        if not sets:
+            return 0
+        result = sets[0]
+        for bits in sets[1:]:
+            result = result & bits if match == "all" else result | bits
+        return result
+
+    def lookup(self, animals, match="any"):
+        """Відсортовані індекси рослин, небезпечних для вказаних тварин."""
+        return bitset_to_indices(self.bitset(animals, match))
+
+
+def get_animal_index(plants):
+    return cached_index("animals", plants, AnimalIndex)
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class SymptomIndex:
+    """Триграмний індекс словника симптомів.
+
+    Триграма -> ідентифікатори симптомів, симптом -> позиції рослин
+    (з повтором, якщо симптом записано в рослини кілька разів). Частоти
+    симптомів обчислюються під час побудови.
+    """
+
+    def __init__(self, plants):
+        self.names = []
+        self.lower = []
+        ids = {}
+        self.postings = []
+
+        for position, plant in enumerate(plants):
+            for symptom in plant.symptoms:
+                name = symptom.name
+                symptom_id = ids.get(name)
+                if symptom_id is None:
+                    symptom_id = ids[name] = len(self.names)
+                    self.names.append(name)
+                    self.lower.append(name.lower())
+                    self.postings.append([])
+                self.postings[symptom_id].append(position)
+
+        self.frequencies = [len(positions) for positions in self.postings]
+        # Стабільне сортування - той самий порядок, що й Counter.most_common
+        self.by_frequency = sorted(range(len(self.names)), key=lambda i: -self.frequencies[i])
+
+        self._fuzzy = None
+        self._fuzzy_lock = threading.Lock()
+
+        self.trigrams = {}
+        for symptom_id, name in enumerate(self.lower):
+            for gram in trigrams(name):
+                self.trigrams.setdefault(gram, []).append(symptom_id)
+
+    def match(self, query):
+        """Ідентифікатори симптомів, що містять query як підрядок."""
+        query = query.lower()
+        if len(query) < 3:
+            candidates = range(len(self.names))
+        else:
+            candidates = None
+            for gram in sorted(trigrams(query), key=lambda g: len(self.trigrams.get(g, ()))):
+                posting = self.trigrams.get(gram)
+                if not posting:
+                    return []
+                candidates = set(posting) if candidates is None else candidates.intersection(posting)
+                if not candidates:
+                    return []
+            candidates = sorted(candidates)
+        return [i for i in candidates if query in self.lower[i]]
+
+    def plant_match_counts(self, symptom_ids):
+        """Counter: позиція рослини -> кількість збігів серед її симптомів."""
+        counts = Counter()
+        for symptom_id in symptom_ids:
+            counts.update(self.postings[symptom_id])
+        return counts
+
+    def suggest(self, query, limit=5):
+        """Виправлення запиту з помилками: [(термін, відстань), ...]."""
+        with self._fuzzy_lock:
+            if self._fuzzy is None:
+                terms = {}
+                for symptom_id, name in enumerate(self.lower):
+                    for term in [name] + _TOKEN_SPLIT.split(name):
+                        if len(term) >= 3:
+                            terms[term] = terms.get(term, 0) + self.frequencies[symptom_id]
+                self._fuzzy = FuzzyIndex(terms, weights=terms)
+            fuzzy = self._fuzzy
+        return fuzzy.lookup(query, limit)
+
+    def most_common(self, limit):
+        """Найчастіші симптоми: [(назва, кількість), ...]."""
+        return [(self.names[i], self.frequencies[i]) for i in self.by_frequency[:limit]]
+
+
+def get_symptom_index(plants):
+    return cached_index("symptoms", plants, SymptomIndex)
+
+
+def edit_distance(a, b, max_distance):
+    """Відстань Дамерау-Левенштейна (OSA) з раннім виходом.
+
+    Якщо відстань більша за max_distance, повертає max_distance + 1.
+    Рахуються лише клітинки смуги |i - j| <= max_distance: решта
+    все одно дають відстань, більшу за max_distance.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    big = max_distance + 1
+    previous2 = None
+    previous = [min(j, big) for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [big] * (len(b) + 1)
+        current[0] = min(i, big)
+        row_min = current[0]
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_distance:
+            return big
+        previous2, previous = previous, current
+    return min(previous[-1], big)
+
+
+class FuzzyIndex:
+    """Словник видалень у стилі SymSpell для пошуку з помилками.
+
+    Для кожного терміну заздалегідь зберігаються всі варіанти його префікса
+    з видаленням до max_distance символів, тому запит перевіряє лише кілька
+    десятків варіантів замість порівняння з усім словником. Терміни зі
+    спільним префіксом мають однакові варіанти, тому варіанти рахуються
+    один раз для групи термінів з цим префіксом.
+    """
+
+    def __init__(self, terms, max_distance=2, prefix_length=7, weights=None):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.terms = list(dict.fromkeys(terms))
+        self.weights = weights or {}
+        groups = {}
+        for term_id, term in enumerate(self.terms):
+            groups.setdefault(term[:prefix_length], []).append(term_id)
+        self.groups = list(groups.values())
+        self.deletes = {}
+        for group_id, prefix in enumerate(groups):
+            for variant in self._variants(prefix):
+                self.deletes.setdefault(variant, []).append(group_id)
+
+    def _variants(self, word):
+        variants = {word}
+        frontier = {word}
+        for _ in range(self.max_distance):
+            frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+            variants |= frontier
+        return variants
+
+    def lookup(self, query, limit=5):
+        """Найближчі терміни: [(термін, відстань), ...], найкращі першими."""
+        query = normalize_name(query)
+        if not query:
+            return []
+
+        group_ids = set()
+        for variant in self._variants(query[:self.prefix_length]):
+            group_ids.update(self.deletes.get(variant, ()))
+
+        scored = []
+        for term_id in (term_id for group_id in group_ids for term_id in self.groups[group_id]):
+            term = self.terms[term_id]
+            if abs(len(term) - len(query)) > self.max_distance:
+                continue  # Групи префіксів великі: відсіюємо без виклику edit_distance
+            distance = edit_distance(query, term, self.max_distance)
+            if distance <= self.max_distance:
+                # При рівній відстані - довший спільний префікс, потім частота
+                shared = len(os.path.commonprefix((query, term)))
+                scored.append((distance, -shared, -self.weights.get(term, 0), term))
+        scored.sort()
+        return [(term, distance) for distance, _, _, term in scored[:limit]]
+
+
+def normalize_name(name):
+    return " ".join(str(name).lower().split())
+
+
+_TOKEN_SPLIT = re.compile(r"[\s\-,.'()/]+")
+# Службові слова назв не індексуються: вони збігаються з багатьма рослинами
+NAME_STOPWORDS = frozenset(("a", "an", "and", "the", "of", "or", "in", "on", "to", "with", "for"))
+
+
+def name_keys(plant):
+    """Ключі пошуку рослини: наукова назва, pid, поширені назви та їхні slug."""
+    keys = [plant.name, plant.pid]
+    for common in plant.common:
+        keys.extend(common)
+    return [normalize_name(key) for key in keys if key]
+
+
+class NameIndex:
+    """Індекс назв рослин: точний пошук (хеш) і префіксний (bisect).
+
+    resolve() повертає ранжовані кандидати; ранг (менший - кращий):
+    0 - точний збіг ключа, 1 - префікс ключа, 2 - точний збіг слова,
+    3 - префікс слова, 4 - підрядок ключа (коли немає збігів 0-3),
+    5 - збіг з помилками (лише коли інших немає).
+    При рівних рангах коротший ключ і менша позиція в базі мають перевагу;
+    підрядки, як і раніше, впорядковуються за позицією в базі.
+
+    Підрядки шукаються через триграмний індекс словника слів назв, а
+    словник видалень для пошуку з помилками будується разом з індексом,
+    тому жоден етап resolve() не переглядає всі ключі.
+    """
+
+    EXACT, PREFIX, TOKEN, TOKEN_PREFIX, SUBSTRING, FUZZY = range(6)
+    # Скільки ключів переглядати для одного префікса
+    MAX_PREFIX_KEYS = 200
+
+    def __init__(self, plants):
+        # Збирач сміття не потрібен під час побудови сотень тисяч дрібних списків
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self._build(plants)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _build(self, plants):
+        self.keys = {}
+        self.tokens = {}
+        self.stopwords = {}  # Лише для підрядків: службові слова не є ключами пошуку
+        self.position_keys = []
+        for position, plant in enumerate(plants):
+            keys = name_keys(plant)
+            self.position_keys.append(keys)
+            for key in keys:
+                self._add(self.keys, key, position)
+                for token in _TOKEN_SPLIT.split(key):
+                    if not token or token == key:
+                        continue
+                    if token in NAME_STOPWORDS:
+                        self._add(self.stopwords, token, position)
+                    else:
+                        self._add(self.tokens, token, position)
+
+        self.sorted_keys = sorted(self.keys)
+        self.sorted_tokens = sorted(self.tokens)
+
+        # Словник слів для підрядків: слова складених ключів і однослівні ключі
+        self.words = sorted(set(self.tokens).union(self.stopwords,
+                                                   (key for key in self.keys if not _TOKEN_SPLIT.search(key))))
+        self.word_trigrams = {}
+        for word_id, word in enumerate(self.words):
+            for gram in trigrams(word):
+                self.word_trigrams.setdefault(gram, []).append(word_id)
+
+        self._fuzzy = FuzzyIndex(list(self.keys) + list(self.tokens))
+
+    @staticmethod
+    def _add(mapping, key, position):
+        positions = mapping.setdefault(key, [])
+        if not positions or positions[-1] != position:
+            positions.append(position)
+
+    def _prefix(self, sorted_keys, prefix):
+        start = bisect.bisect_left(sorted_keys, prefix)
+        end = min(start + self.MAX_PREFIX_KEYS, len(sorted_keys))
+        for key in sorted_keys[start:end]:
+            if not key.startswith(prefix):
+                break
+            yield key
+
+    def resolve(self, query, limit=5):
+        """Ранжовані кандидати: [(позиція рослини, ранг, ключ), ...]."""
+        query = normalize_name(query)
+        if not query:
+            return []
+
+        found = {}
+
+        def offer(mapping, key, rank):
+            for position in mapping[key]:
+                candidate = (rank, len(key), position, key)
+                if position not in found or candidate < found[position]:
+                    found[position] = candidate
+
+        if query in self.keys:
+            offer(self.keys, query, self.EXACT)
+        if query in self.tokens:
+            offer(self.tokens, query, self.TOKEN)
+        for key in self._prefix(self.sorted_keys, query):
+            offer(self.keys, key, self.PREFIX)
+        for token in self._prefix(self.sorted_tokens, query):
+            offer(self.tokens, token, self.TOKEN_PREFIX)
+
+        if not found:
+            # Підрядок будь-де в назві ("ander" -> "nerium oleander")
+            for position, key in self._substring(query, limit):
+                found[position] = (self.SUBSTRING, 0, position, key)
+
+        if not found:
+            for order, (term, _) in enumerate(self.fuzzy().lookup(query, limit)):
+                mapping = self.keys if term in self.keys else self.tokens
+                for position in mapping[term]:
+                    candidate = (self.FUZZY, order, position, term)
+                    if position not in found or candidate < found[position]:
+                        found[position] = candidate
+
+        ranked = sorted(found.values())[:limit]
+        return [(position, rank, key) for rank, _, position, key in ranked]
+
+    def _matching_words(self, part):
+        """Слова словника, що містять part як підрядок."""
+        if len(part) < 3:
+            return [word for word in self.words if part in word]
+        candidates = None
+        for gram in sorted(trigrams(part), key=lambda g: len(self.word_trigrams.get(g, ()))):
+            posting = self.word_trigrams.get(gram)
+            if not posting:
+                return []
+            candidates = set(posting) if candidates is None else candidates.intersection(posting)
+            if not candidates:
+                return []
+        return [self.words[i] for i in sorted(candidates) if part in self.words[i]]
+
+    def _part_positions(self, part):
+        """Позиції рослин, у яких є слово, що містить part."""
+        positions = set()
+        for word in self._matching_words(part):
+            for mapping in (self.keys, self.tokens, self.stopwords):
+                positions.update(mapping.get(word, ()))
+        return positions
+
+    def _substring(self, query, limit):
+        """Перші за позицією рослини, ключ яких містить query: [(позиція, ключ)].
+
+        Частина запиту без роздільників завжди лежить усередині одного слова
+        ключа, тому кандидати - рослини, слова яких містять кожну частину
+        запиту; ключі перевіряються лише в кандидатів.
+        """
+        parts = sorted({part for part in _TOKEN_SPLIT.split(query) if part}, key=len, reverse=True)
+        if not parts:
+            return []
+        candidates = self._part_positions(parts[0])
+        for part in parts[1:]:
+            if not candidates:
+                return []
+            candidates &= self._part_positions(part)
+
+        matches = []
+        for position in sorted(candidates):
+            key = min((key for key in self.position_keys[position] if query in key), default=None)
+            if key is not None:
+                matches.append((position, key))
+                if len(matches) == limit:
+                    break
+        return matches
+
+    def fuzzy(self):
+        """Словник видалень над ключами і словами (будується разом з індексом)."""
+        return self._fuzzy
+
+
+def get_name_index(plants):
+    return cached_index("names", plants, NameIndex)
+
+
+def resolve_plant(plants, query, limit=5):
+    """Знаходить рослину за назвою.
+
+    Повертає (рослина або None, список кандидатів для показу користувачу).
+    """
+    candidates = get_name_index(plants).resolve(query, limit)
+    ranked = [
+        {
+            "scientific_name": plants[position].name,
+            "matched": key,
+            "rank": rank,
+            "fuzzy": rank == NameIndex.FUZZY,
+        }
+        for position, rank, key in candidates
+    ]
+    found = plants[candidates[0][0]] if candidates else None
+    return found, ranked
+
+
+def parse_animals(animal_names):
+    """Розбирає рядок "dogs, cats" або список на унікальні канонічні назви."""
+    if isinstance(animal_names, str):
+        animal_names = animal_names.split(",")
+    animals = []
+    for name in animal_names:
+        if str(name).strip():
+            canonical = canonical_animal(name)
+            if canonical not in animals:
+                animals.append(canonical)
+    return animals
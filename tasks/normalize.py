@@ -0,0 +1,276 @@
+# tasks/normalize.py
+"""
+Нормалізація записів рослин до канонічної схеми.
+
+Виконується один раз під час завантаження (load_plants_data, iter_plants)
+або оновлення даних, тому задачі читають поля напряму, без перевірок типів.
+Канонічний запис - компактний PlantRecord (__slots__):
+
+    pid: str | None
+    name: str
+    common_name: str                  # перша поширена назва або ""
+    common: (Named(name, slug), ...)
+    family: str                       # "" якщо не вказана
+    severity: Severity(label, level)
+    animals: (str, ...)
+    symptoms: (Named(name, slug), ...)
+    wikipedia_url: str | None
+
+Категоріальні рядки (родини, тварини, назви симптомів) інтернуються, а
+однакові Severity/Named спільні для всіх записів одного завантаження. Інші поля (зокрема великі
+масиви images) відкидаються. Некоректні записи (не об'єкт, без наукової
+назви, списки неправильного типу) відхиляються і повертаються окремо для
+звіту. Нормалізація ідемпотентна.
+"""
+import os
+import re
+import sys
+from collections import namedtuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from log import log, log_error
+
+
+_SLUG_SPLIT = re.compile(r"[^\w]+")
+
+Severity = namedtuple("Severity", "label level")
+Named = namedtuple("Named", "name slug")
+
+def _share(shared, value):
+    """Спільний екземпляр значення в межах одного пакета записів (shared)."""
+    return value if shared is None else shared.setdefault(value, value)
+
+
+def _shared_row(memo, kind, value):
+    """Спільний канонічний об'єкт для значення з to_row()."""
+    key = (kind, value)
+    result = memo.get(key)
+    if result is None:
+        if kind == "severity":
+            result = Severity(sys.intern(value[0]), value[1])
+        elif kind == "animals":
+            result = tuple(map(sys.intern, value))
+        elif kind == "named":
+            result = Named(sys.intern(value[0]), sys.intern(value[1]))
+        else:
+            result = tuple(_shared_row(memo, "named", item) for item in value)
+        memo[key] = result
+    return result
+
+
+def records_from_rows(rows):
+    """Список PlantRecord з рядків to_row()."""
+    memo = {}
+    return [PlantRecord.from_row(row, memo) for row in rows]
+
+
+class PlantRecord:
+    """Канонічний запис рослини."""
+
+    __slots__ = ("pid", "name", "common_name", "common", "family", "severity",
+                 "animals", "symptoms", "wikipedia_url")
+
+    def __init__(self, pid, name, common_name, common, family, severity,
+                 animals, symptoms, wikipedia_url):
+        self.pid = pid
+        self.name = name
+        self.common_name = common_name
+        self.common = common
+        self.family = family
+        self.severity = severity
+        self.animals = animals
+        self.symptoms = symptoms
+        self.wikipedia_url = wikipedia_url
+
+    def to_row(self):
+        """Кортеж з простих типів (для знімка і порівняння)."""
+        return (self.pid, self.name, self.common_name, tuple(map(tuple, self.common)),
+                self.family, tuple(self.severity), self.animals,
+                tuple(map(tuple, self.symptoms)), self.wikipedia_url)
+
+    @classmethod
+    def from_row(cls, row, memo=None):
+        """Запис із to_row(); memo спільний для пакета рядків прискорює розбір."""
+        if memo is None:
+            memo = {}
+        pid, name, common_name, common, family, severity, animals, symptoms, url = row
+        return cls(pid, name, common_name, _shared_row(memo, "named_list", common),
+                   sys.intern(family), _shared_row(memo, "severity", severity),
+                   _shared_row(memo, "animals", animals),
+                   _shared_row(memo, "named_list", symptoms), url)
+
+    def to_dict(self):
+        return {
+            "pid": self.pid,
+            "name": self.name,
+            "common_name": self.common_name,
+            "common": [item._asdict() for item in self.common],
+            "family": self.family,
+            "severity": self.severity._asdict(),
+            "animals": list(self.animals),
+            "symptoms": [item._asdict() for item in self.symptoms],
+            "wikipedia_url": self.wikipedia_url,
+        }
+
+    def __eq__(self, other):
+        return isinstance(other, PlantRecord) and self.to_row() == other.to_row()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"PlantRecord({self.name!r})"
+
+
+def slugify(text):
+    return _SLUG_SPLIT.sub("-", text.lower()).strip("-")
+
+
+def severity_label(severity_obj):
+    """Мітка рівня небезпеки: label, інакше name/level/severity, інакше "Unknown"."""
+    if isinstance(severity_obj, dict):
+        label = severity_obj.get("label")
+        if label:
+            return label
+        for key in ["name", "level", "severity"]:
+            if key in severity_obj:
+                return str(severity_obj[key])
+        return "Unknown"
+    if severity_obj:
+        return str(severity_obj)
+    return "Unknown"
+
+
+def animal_value(animal):
+    """Рядкове значення запису тварини (рядок або словник)."""
+    if isinstance(animal, dict):
+        return str(list(animal.values())[0]) if animal else ""
+    return str(animal)
+
+
+def _list_field(raw, key):
+    value = raw.get(key)
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise ValueError(f"поле '{key}' має бути списком")
+    for item in value:
+        if not isinstance(item, (str, dict)):
+            raise ValueError(f"некоректний елемент у полі '{key}'")
+    return value
+
+
+def _named_items(items, shared=None):
+    """Кортеж спільних Named з рядків або словників, без порожніх назв."""
+    result = []
+    for item in items:
+        if isinstance(item, dict):
+            name = item.get("name")
+            if name is None:
+                continue
+            name = str(name)
+            slug = item.get("slug") or slugify(name)
+        else:
+            name, slug = item, slugify(item)
+        if name:
+            result.append(_share(shared, Named(sys.intern(name), sys.intern(str(slug)))))
+    return _share(shared, tuple(result))
+
+
+def _optional_str(value):
+    return str(value) if value not in (None, "") else None
+
+
+def normalize_plant(raw, shared=None):
+    """Канонічний запис рослини. Викидає ValueError для некоректного запису.
+
+    shared - словник спільних Severity/Named/кортежів для пакета записів;
+    він живе лише поки пакет нормалізується, тому пам'ять не накопичується
+    між перезавантаженнями даних.
+    """
+    if isinstance(raw, PlantRecord):
+        return raw
+    if not isinstance(raw, dict):
+        raise ValueError("запис не є об'єктом")
+    name = raw.get("name")
+    if not isinstance(name, str) or not name.strip():
+        raise ValueError("відсутня наукова назва")
+
+    severity = raw.get("severity")
+    level = severity.get("level") if isinstance(severity, dict) else None
+    if not isinstance(level, int) or isinstance(level, bool):
+        level = 0
+
+    common = _named_items(_list_field(raw, "common"), shared)
+    if not common and raw.get("common_name"):
+        common = _named_items([str(raw["common_name"])], shared)
+
+    return PlantRecord(
+        pid=_optional_str(raw.get("pid")),
+        name=name,
+        common_name=common[0].name if common else "",
+        common=common,
+        family=sys.intern(str(raw.get("family") or "")),
+        severity=_share(shared, Severity(sys.intern(str(severity_label(severity))), level)),
+        animals=_share(shared, tuple(sys.intern(value) for value in map(animal_value, _list_field(raw, "animals"))
+                             if value)),
+        symptoms=_named_items(_list_field(raw, "symptoms"), shared),
+        wikipedia_url=_optional_str(raw.get("wikipedia_url")),
+    )
+
+
+def normalize_plants(raw_plants):
+    """Нормалізує список записів.
+
+    Повертає (канонічні записи, відхилені), де кожен відхилений запис
+    описано як {"index", "name", "reason"}.
+    """
+    plants = []
+    rejected = []
+    shared = {}
+    for index, raw in enumerate(raw_plants):
+        try:
+            plants.append(normalize_plant(raw, shared))
+        except ValueError as e:
+            name = raw.get("name") if isinstance(raw, dict) else None
+            rejected.append({"index": index, "name": name, "reason": str(e)})
+    return plants, rejected
+
+
+def report_rejected(rejected, source="plants.json"):
+    """Виводить звіт про відхилені записи."""
+    if not rejected:
+        return
+    log_error(f"{source}: відхилено {len(rejected)} некоректних записів")
+    for item in rejected[:10]:
+        log_error(f"    #{item['index']} {item['name'] or '?'}: {item['reason']}")
+    if len(rejected) > 10:
+        log_error(f"    ... та ще {len(rejected) - 10}")
+
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Перевірка записів plants.json")
+    parser.add_argument("input_file", nargs="?", default="plants.json",
+                        help="JSON файл з даними (за замовчуванням: plants.json)")
+
+    args = parser.parse_args()
+
+    try:
+        with open(args.input_file, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        log_error(f"{e}")
+        return 1
+    if isinstance(data, dict) and "data" in data:
+        data = data["data"]
+
+    plants, rejected = normalize_plants(data)
+    log(f"Коректних записів: {len(plants)}, відхилено: {len(rejected)}")
+    report_rejected(rejected, args.input_file)
+    return 0 if not rejected else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
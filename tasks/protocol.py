@@ -0,0 +1,173 @@
+# tasks/protocol.py
+"""
+Буферизований журнал протоколу (protocol.txt).
+
+Виклик write() лише кладе запис у чергу в пам'яті; фоновий потік збирає
+записи в пакети і дописує їх у файл, коли пакет заповнено або минув
+інтервал очікування. Перед завершенням інтерпретатора черга скидається.
+Запис відбувається під міжпроцесним блокуванням окремого .lock файлу,
+тому рядки з кількох процесів задач не перемішуються. Коли файл
+перевищує max_bytes, його вміст архівується у gzip поруч із журналом.
+"""
+import atexit
+import datetime
+import glob
+import gzip
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from log import log_error
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+_STOP = object()
+
+
+def lock_file(f):
+    """Міжпроцесне ексклюзивне блокування відкритого файлу (чекає на звільнення)."""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:  # LK_LOCK здається після ~10 с очікування
+            continue
+
+
+def unlock_file(f):
+    """Знімає блокування lock_file."""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        return
+    f.seek(0)
+    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ProtocolLogger:
+    """Журнал з чергою в пам'яті та фоновим потоком запису."""
+
+    def __init__(self, path, flush_lines=256, flush_interval=0.5,
+                 max_bytes=1 << 20, backup_count=5):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._atexit_registered = False
+
+    def write(self, message):
+        """Додає запис у чергу; час запису фіксується в момент виклику."""
+        self._queue.put((time.time(), message))
+        if self._thread is None:
+            self._start()
+
+    def flush(self, timeout=5):
+        """Чекає, доки всі записи з черги потраплять у файл."""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self, timeout=5):
+        """Скидає чергу і зупиняє фоновий потік."""
+        with self._start_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="protocol-logger", daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                atexit.register(self.close)
+                self._atexit_registered = True
+
+    def _run(self):
+        batch = []
+        deadline = 0.0
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if batch else None
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, tuple):
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+                if len(batch) < self.flush_lines:
+                    continue
+
+            self._write(batch)
+            batch = []
+            if item is _STOP:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+
+    def _write(self, batch):
+        if not batch:
+            return
+        payload = "".join(
+            f"[{datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')}] {message}\n"
+            for ts, message in batch
+        ).encode("utf-8")
+        try:
+            with open(self.lock_path, "a+b") as lock:
+                lock_file(lock)
+                try:
+                    self._rotate(len(payload))
+                    with open(self.path, "ab") as f:
+                        f.write(payload)
+                finally:
+                    unlock_file(lock)
+        except Exception as e:
+            log_error(f"{e}")
+
+    def _rotate(self, incoming):
+        """Архівує журнал у gzip, якщо новий пакет перевищить max_bytes."""
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if not self.max_bytes or size == 0 or size + incoming <= self.max_bytes:
+            return
+
+        stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        archive = f"{self.path}.{stamp}.gz"
+        counter = 1
+        while os.path.exists(archive):
+            archive = f"{self.path}.{stamp}-{counter}.gz"
+            counter += 1
+
+        with open(self.path, "rb") as src, gzip.open(archive, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        with open(self.path, "wb"):
+            pass  # Файл очищується, а не видаляється - інші процеси пишуть у той самий шлях
+
+        archives = sorted(glob.glob(glob.escape(self.path) + ".*.gz"), key=os.path.getmtime)
+        for old in archives[:max(0, len(archives) - self.backup_count)]:
+            os.remove(old)
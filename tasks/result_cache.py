@@ -0,0 +1,409 @@
+# tasks/result_cache.py
+"""
+Дисковий кеш результатів задач.
+
+Ключ запису - назва задачі, аргументи виклику (з підставленими значеннями
+за замовчуванням) і відбиток файлу даних (шлях, розмір, mtime - як у кеші
+load_plants_data), тому після зміни plants.json старі записи просто
+перестають збігатися. Вміст файлу не хешується: копія plants.json з
+таким самим вмістом в іншому місці чи з іншим mtime не влучає в кеш.
+Разом з результатом зберігаються записи протоколу задачі: при влучанні
+вони повторюються у protocol.txt, а час у timestamp оновлюється.
+
+Кожен запис - окремий JSON файл, що пишеться атомарно; час останнього
+використання (mtime) оновлюється при кожному влучанні, а найдавніше
+використані записи видаляються, коли кеш перевищує ліміт кількості або
+розміру. Кількість і розмір записів ведуться у stats.json під
+міжпроцесним блокуванням, тому запис у кеш не обходить усі записи:
+обхід і витіснення потрібні лише після перевищення ліміту.
+
+Кеш спільний для всіх процесів користувача (CLI, демон, main_launcher) і
+лежить у його особистій папці кешу з правами 0700; папка, що належить
+іншому користувачу або доступна іншим, не використовується.
+GREENLEAF_CACHE_DIR задає папку кешу, GREENLEAF_NO_RESULT_CACHE вимикає його.
+"""
+import atexit
+import datetime
+import functools
+import hashlib
+import inspect
+import json
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+from collections.abc import Iterator
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from log import log, log_error
+
+try:
+    from .utils import resolve_data_file, log_protocol, capture_protocol, count_records
+    from .protocol import lock_file, unlock_file
+except ImportError:
+    from utils import resolve_data_file, log_protocol, capture_protocol, count_records
+    from protocol import lock_file, unlock_file
+
+
+CACHE_VERSION = 2
+MAX_ENTRIES = 2000
+MAX_BYTES = 64 << 20
+# Витіснення залишає таку частку лімітів, щоб наступний обхід був нескоро
+EVICT_TO = 0.9
+# Аргументи, що не впливають на вміст результату
+IGNORED_ARGS = ("input_file", "stream", "lazy")
+
+
+def default_cache_dir():
+    """Папка кешу: GREENLEAF_CACHE_DIR, інакше XDG_CACHE_HOME або ~/.cache."""
+    path = os.environ.get("GREENLEAF_CACHE_DIR")
+    if path:
+        return path
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    if not os.path.isabs(base):
+        base = tempfile.gettempdir()
+    return os.path.join(base, "greenleaf", "results")
+
+
+def cache_enabled():
+    return not os.environ.get("GREENLEAF_NO_RESULT_CACHE")
+
+
+class ResultCache:
+    """Кеш результатів з витісненням найдавніше використаних записів (LRU)."""
+
+    def __init__(self, path=None, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.path = path or default_cache_dir()
+        self.entries_dir = os.path.join(self.path, "entries")
+        self.lock_path = os.path.join(self.path, ".lock")
+        self.stats_path = os.path.join(self.path, "stats.json")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._stats = Counter()
+        self._lock = threading.Lock()
+        self._trusted = None
+        self._atexit_registered = False
+
+    def usable(self):
+        """Створює папку кешу (0700) і перевіряє, що вона належить поточному користувачу."""
+        if self._trusted is None:
+            try:
+                os.makedirs(self.path, mode=0o700, exist_ok=True)
+                stat = os.stat(self.path)
+                if hasattr(os, "getuid"):
+                    if stat.st_uid != os.getuid():
+                        raise PermissionError("папка належить іншому користувачу")
+                    if stat.st_mode & 0o077:
+                        os.chmod(self.path, 0o700)
+                self._trusted = True
+            except OSError as e:
+                log_error(f"Кеш результатів вимкнено ({self.path}): {e}")
+                self._trusted = False
+        return self._trusted
+
+    def dataset_fingerprint(self, json_path):
+        """Відбиток файлу даних без читання вмісту: шлях, розмір і mtime."""
+        stat = os.stat(json_path)
+        return [os.path.realpath(json_path), stat.st_size, stat.st_mtime_ns]
+
+    def key(self, task, params, fingerprint):
+        encoded = json.dumps([CACHE_VERSION, task, params, fingerprint],
+                             sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.blake2b(encoded.encode("utf-8"), digest_size=16).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.entries_dir, key[:2], key + ".json")
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+            if not self._atexit_registered:
+                atexit.register(self.flush_stats)
+                self._atexit_registered = True
+
+    def get(self, key):
+        """Запис {"result", "protocol"} для ключа або None."""
+        if not self.usable():
+            return None
+        path = self._entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._count("misses")
+            return None
+        try:
+            os.utime(path)  # Час останнього використання для LRU
+        except OSError:
+            pass
+        self._count("hits")
+        return entry
+
+    def put(self, key, task, params, result, protocol=()):
+        if not self.usable():
+            return False
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            try:
+                previous_size = os.stat(path).st_size
+            except OSError:
+                previous_size = None
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"task": task, "params": params, "result": result,
+                           "protocol": list(protocol)}, f,
+                          ensure_ascii=False, separators=(",", ":"))
+                size = f.tell()
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            log_error(f"Не вдалося записати результат у кеш: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+        self._count("writes")
+        if previous_size is None:
+            self._account(1, size)
+        else:
+            self._account(0, size - previous_size)
+        return True
+
+    def _entries(self):
+        """[(mtime, розмір, шлях), ...] для всіх записів кешу."""
+        entries = []
+        try:
+            buckets = list(os.scandir(self.entries_dir))
+        except OSError:
+            return entries
+        for bucket in buckets:
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.name.endswith(".json"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return entries
+
+    def _account(self, entries, size):
+        """Додає запис до обліку кількості й розміру кешу; витісняє понад ліміти.
+
+        Облік у stats.json оновлюється за O(1); записи обходяться лише тоді,
+        коли обліку ще немає (новий або очищений кеш) або ліміт перевищено.
+        Після обходу облік замінюється точними значеннями.
+        """
+        try:
+            with open(self.lock_path, "a+b") as lock:
+                lock_file(lock)
+                try:
+                    stats = self._read_stats()
+                    if isinstance(stats.get("entries"), int) and isinstance(stats.get("bytes"), int):
+                        stats["entries"] += entries
+                        stats["bytes"] += size
+                        over = stats["entries"] > self.max_entries or stats["bytes"] > self.max_bytes
+                    else:
+                        over = True
+                    if over:
+                        stats["entries"], stats["bytes"] = self._evict()
+                    self._write_stats(stats)
+                finally:
+                    unlock_file(lock)
+        except OSError as e:
+            log_error(f"Не вдалося очистити кеш результатів: {e}")
+
+    def _evict(self):
+        """Видаляє найдавніше використані записи понад ліміти (під блокуванням).
+
+        Кеш зменшується до EVICT_TO лімітів, а не до самих лімітів, інакше
+        кожен наступний запис знову вимагав би обходу. Повертає (кількість,
+        розмір) записів, що залишилися.
+        """
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if len(entries) <= self.max_entries and total <= self.max_bytes:
+            return len(entries), total
+        max_entries = int(self.max_entries * EVICT_TO)
+        max_bytes = int(self.max_bytes * EVICT_TO)
+        entries.sort()
+        removed = 0
+        for _, size, path in entries:
+            if len(entries) - removed <= max_entries and total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            removed += 1
+            total -= size
+        self._count("evictions", removed)
+        return len(entries) - removed, total
+
+    def flush_stats(self):
+        """Додає лічильники процесу до спільної статистики кешу."""
+        with self._lock:
+            pending, self._stats = self._stats, Counter()
+        if not pending or not self.usable():
+            return
+        try:
+            with open(self.lock_path, "a+b") as lock:
+                lock_file(lock)
+                try:
+                    stats = Counter(self._read_stats())
+                    stats.update(pending)
+                    self._write_stats(dict(stats))
+                finally:
+                    unlock_file(lock)
+        except OSError as e:
+            log_error(f"Не вдалося зберегти статистику кешу: {e}")
+
+    def _read_stats(self):
+        try:
+            with open(self.stats_path, "r", encoding="utf-8") as f:
+                stats = json.load(f)
+            return stats if isinstance(stats, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def _write_stats(self, stats):
+        """Записує stats.json (викликається під блокуванням)."""
+        tmp_path = f"{self.stats_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(stats, f)
+        os.replace(tmp_path, self.stats_path)
+
+    def stats(self):
+        """Статистика: влучання, промахи, записи, витіснення, кількість і розмір записів."""
+        self.flush_stats()
+        stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+        stats.update(self._read_stats())
+        lookups = stats["hits"] + stats["misses"]
+        entries = self._entries()
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["entries"] = len(entries)
+        stats["bytes"] = sum(size for _, size, _ in entries)
+        return stats
+
+    def clear(self):
+        """Видаляє всі записи і статистику."""
+        with self._lock:
+            self._stats.clear()
+        removed = 0
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+        try:
+            os.remove(self.stats_path)
+        except OSError:
+            pass
+        return removed
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Спільний кеш результатів процесу."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
+
+
+def reset_result_cache():
+    """Зберігає статистику спільного кешу і забуває його.
+
+    Наступний get_result_cache() створить кеш заново з поточним
+    GREENLEAF_CACHE_DIR.
+    """
+    global _cache
+    with _cache_lock:
+        cache, _cache = _cache, None
+    if cache is not None:
+        cache.flush_stats()
+
+
+def cached_result(task):
+    """Декоратор функції задачі: повторний виклик з тими самими аргументами і
+    даними повертає збережений результат без обчислення.
+
+    Результати з помилкою та результати з ітераторами (lazy=True) не кешуються.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not cache_enabled():
+                return func(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = bound.arguments
+            data_file = resolve_data_file(arguments.get("input_file", "plants.json"))
+            if arguments.get("lazy") or data_file is None:
+                return func(*args, **kwargs)
+
+            cache = get_result_cache()
+            params = {name: value for name, value in arguments.items() if name not in IGNORED_ARGS}
+            try:
+                key = cache.key(task, params, cache.dataset_fingerprint(data_file))
+            except (OSError, TypeError, ValueError):
+                return func(*args, **kwargs)
+
+            entry = cache.get(key)
+            if entry is not None:
+                count_records("cache_hits")
+                # Протокол задачі такий самий, як і без кешу
+                for message in entry.get("protocol", ()):
+                    log_protocol(message)
+                result = entry["result"]
+                if isinstance(result, dict) and "timestamp" in result:
+                    result["timestamp"] = datetime.datetime.now().isoformat()
+                return result
+
+            with capture_protocol() as messages:
+                result = func(*args, **kwargs)
+            if (isinstance(result, dict) and "error" not in result
+                    and not any(isinstance(value, Iterator) for value in result.values())):
+                cache.put(key, task, params, result, messages)
+            return result
+        return wrapper
+    return decorator
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Кеш результатів задач")
+    parser.add_argument("command", choices=["stats", "clear"],
+                        help="stats - статистика кешу, clear - очистити кеш")
+    parser.add_argument("--dir", default=None,
+                        help="Папка кешу (за замовчуванням: GREENLEAF_CACHE_DIR або ~/.cache/greenleaf/results)")
+
+    args = parser.parse_args()
+    cache = ResultCache(args.dir)
+
+    if args.command == "clear":
+        log(f"Видалено {cache.clear()} записів з {cache.path}")
+        return 0
+
+    stats = cache.stats()
+    log(f"Кеш результатів: {cache.path}")
+    print(f"    Записів: {stats['entries']} ({stats['bytes'] / 1e6:.1f} MB)")
+    print(f"    Влучань: {stats['hits']}, промахів: {stats['misses']} "
+          f"(частка влучань {stats['hit_rate']:.1%})")
+    print(f"    Записано: {stats['writes']}, витіснено: {stats['evictions']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
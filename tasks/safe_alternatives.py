@@ -8,9 +8,17 @@ import os
 from collections import defaultdict
 
 try:
-    from .utils import load_plants_data, save_results, log_protocol
+    from .utils import load_plants_data, save_results, log_protocol, run_batch
+    from .utils import instrumented, timed, count_records, enable_metrics
+    from .result_cache import cached_result
+    from .indexes import resolve_plant
+    from .client import run_task
 except ImportError:
-    from utils import load_plants_data, save_results, log_protocol
+    from utils import load_plants_data, save_results, log_protocol, run_batch
+    from utils import instrumented, timed, count_records, enable_metrics
+    from result_cache import cached_result
+    from indexes import resolve_plant
+    from client import run_task
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from log import log, log_error
@@ -64,49 +72,25 @@ KNOWN_SAFE_PLANTS = [
 ]
 
 
+@instrumented("safe_alternatives")
+@cached_result("safe_alternatives")
 def find_safe_alternatives(dangerous_plant, user_animals, input_file="plants.json"):
     """Знаходить безпечні альтернативи для небезпечної рослини."""
-    plants_db = load_plants_data(input_file)
+    with timed("load"):
+        plants_db = load_plants_data(input_file)
     if not plants_db:
         return {"error": "Не вдалося завантажити базу даних"}
 
-    plant_lower = dangerous_plant.lower().strip()
-    found_plant = None
-
-    for plant in plants_db:
-        if plant_lower in plant.get("name", "").lower():
-            found_plant = plant
-            break
-        for common in plant.get("common", []):
-            common_name = (
-                common.get("name", "") if isinstance(common, dict) else str(common)
-            )
-            if plant_lower in common_name.lower():
-                found_plant = plant
-                break
-        if found_plant:
-            break
+    found_plant, candidates = resolve_plant(plants_db, dangerous_plant)
 
     user_animals_lower = [a.lower().strip() for a in user_animals]
 
     mild_plants = []
     for plant in plants_db:
-        severity = plant.get("severity", {})
-        sev_label = (
-            severity.get("label", "").lower()
-            if isinstance(severity, dict)
-            else str(severity).lower()
-        )
-
-        if sev_label != "mild":
+        if plant.severity.label.lower() != "mild":
             continue
 
-        plant_animals = []
-        for a in plant.get("animals", []):
-            if isinstance(a, dict):
-                plant_animals.append(str(list(a.values())[0]).lower())
-            else:
-                plant_animals.append(str(a).lower())
+        plant_animals = [a.lower() for a in plant.animals]
 
         is_safe_for_user = True
         for user_animal in user_animals_lower:
@@ -118,24 +102,23 @@ def find_safe_alternatives(dangerous_plant, user_animals, input_file="plants.jso
                 break
 
         if is_safe_for_user:
-            common_names = []
-            for c in plant.get("common", []):
-                if isinstance(c, dict):
-                    common_names.append(c.get("name", ""))
-
             mild_plants.append(
                 {
-                    "scientific_name": plant.get("name", ""),
-                    "common_name": common_names[0] if common_names else "",
-                    "family": plant.get("family", ""),
+                    "scientific_name": plant.name,
+                    "common_name": plant.common_name,
+                    "family": plant.family,
                     "severity": "Mild",
                 }
             )
 
+    count_records("scanned", len(plants_db))
+    count_records("matched", len(mild_plants))
+
     result = {
         "task": "safe_alternatives",
         "timestamp": __import__("datetime").datetime.now().isoformat(),
         "query_plant": dangerous_plant,
+        "candidates": candidates,
         "user_animals": user_animals,
         "dangerous_plant_info": None,
         "alternatives_from_db": mild_plants[:10],
@@ -143,22 +126,17 @@ def find_safe_alternatives(dangerous_plant, user_animals, input_file="plants.jso
     }
 
     if found_plant:
-        severity = found_plant.get("severity", {})
         result["dangerous_plant_info"] = {
-            "scientific_name": found_plant.get("name", ""),
-            "family": found_plant.get("family", ""),
-            "severity": (
-                severity.get("label", "")
-                if isinstance(severity, dict)
-                else str(severity)
-            ),
+            "scientific_name": found_plant.name,
+            "family": found_plant.family,
+            "severity": found_plant.severity.label,
         }
 
     log_protocol(f"Пошук альтернатив для: {dangerous_plant}")
     return result
 
 
-def main():
+def main(argv=None):
     import argparse
 
     parser = argparse.ArgumentParser(description="Пошук безпечних альтернатив рослинам")
@@ -168,8 +146,31 @@ def main():
     )
     parser.add_argument("plant", nargs="?", help="Назва рослини")
     parser.add_argument("animals", nargs="?", help="Тварини (через кому)")
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="JSONL файл із запитами (один JSON об'єкт з аргументами на рядок)",
+    )
+    parser.add_argument(
+        "--batch-output",
+        default="-",
+        help="Файл для JSONL результатів пакетного режиму (за замовчуванням: stdout)",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="Зберегти метрики фаз задачі у JSON файл (і .prom поруч)",
+    )
+
+    args = parser.parse_args(argv)
+    if args.metrics:
+        enable_metrics(args.metrics)
 
-    args = parser.parse_args()
+    if args.batch:
+        stats = run_batch(
+            args.batch, find_safe_alternatives, args.batch_output, {"input_file": args.input}
+        )
+        return 0 if stats["errors"] == 0 else 1
 
     if args.plant:
         plant = args.plant
@@ -198,13 +199,19 @@ def main():
         
         user_animals = [a.strip() for a in animals_input.split(",")]
 
-    results = find_safe_alternatives(plant, user_animals, args.input)
+    results = run_task(
+        "safe_alternatives",
+        {"dangerous_plant": plant, "user_animals": user_animals, "input_file": args.input},
+        find_safe_alternatives,
+    )
 
     if "error" in results:
         log_error(results["error"])
         return 1
 
-    if save_results(results, args.output):
+    with timed("serialize", "safe_alternatives"):
+        saved = save_results(results, args.output)
+    if saved:
         log(f"Результати збережено у {args.output}")
 
     print("\n" + "=" * 60)
@@ -213,6 +220,9 @@ def main():
 
     if results["dangerous_plant_info"]:
         info = results["dangerous_plant_info"]
+        candidates = results.get("candidates", [])
+        if candidates and candidates[0]["fuzzy"]:
+            print(f"\nМожливо, ви мали на увазі: {candidates[0]['matched']}")
         print(f"\nНебезпечна рослина: {info['scientific_name']}")
         print(f"Родина: {info['family']}")
         print(f"Рівень небезпеки: {info['severity']}")
@@ -1,90 +1,186 @@
 # tasks/search_animals.py
 try:
-    from .utils import load_plants_data, save_results, log_protocol
+    from .utils import load_plants_data, iter_plants, save_results, log_protocol, run_batch
+    from .utils import instrumented, timed, timed_iter, count_records, enable_metrics
+    from .result_cache import cached_result
+    from .columnar import open_columnar_store
+    from .indexes import canonical_animal, get_animal_index, is_known_animal, parse_animals
+    from .client import run_task
 except ImportError:
-    from utils import load_plants_data, save_results, log_protocol
+    from utils import load_plants_data, iter_plants, save_results, log_protocol, run_batch
+    from utils import instrumented, timed, timed_iter, count_records, enable_metrics
+    from result_cache import cached_result
+    from columnar import open_columnar_store
+    from indexes import canonical_animal, get_animal_index, is_known_animal, parse_animals
+    from client import run_task
 import sys
 
 from log import log, log_error
 
-def search_dangerous_plants_for_animal(animal_name, input_file="plants.json"):
-    plants = load_plants_data(input_file)
-    if not plants:
-        return {"error": "Не вдалося завантажити дані"}
-    
-    animal_lower = animal_name.lower()
+def _plant_info(plant):
+    return {
+        "scientific_name": plant.name,
+        "common_name": plant.common_name,
+        "family": plant.family,
+        "severity": plant.severity.label,
+        "animals_affected": list(plant.animals),
+        "symptoms": [s.name for s in plant.symptoms],
+    }
+
+def _search_in_plants(plants, animals, match):
+    """Пошук через інвертований індекс тварин. Повертає (позиції, опис позиції)."""
+    index = get_animal_index(plants)
+    return index.lookup(animals, match), lambda i: _plant_info(plants[i])
+
+def _search_in_stream(plants, animals, match):
+    """Один прохід по ітератору рослин. Повертає (кількість рослин, знайдені рослини)."""
+    wanted = set(animals)
+    test = wanted.issubset if match == "all" else (lambda found: not wanted.isdisjoint(found))
+    total_plants = 0
     dangerous_plants = []
-    
     for plant in plants:
-        animals_list = plant.get('animals', [])
-        if not animals_list:
-            continue
-
-        animals_lower = []
-        for animal in animals_list:
-            if isinstance(animal, dict):
-                animal_value = str(list(animal.values())[0]) if animal else ""
-            else:
-                animal_value = str(animal)
-            animals_lower.append(animal_value.lower())
-
-        found = any(animal_lower in a or a in animal_lower for a in animals_lower)
-        
-        if found:
-            plant_info = {
-                "scientific_name": plant.get('name', 'Unknown'),
-                "common_name": plant.get('common_name', ''),
-                "family": plant.get('family', 'Unknown'),
-                "severity": plant.get('severity', {}).get('label', 'Unknown'),
-                "animals_affected": animals_list
-            }
-
-            symptoms = []
-            raw_symptoms = plant.get('symptoms', [])
-            for symptom in raw_symptoms:
-                if isinstance(symptom, dict):
-                    symptoms.append(symptom.get('name', str(symptom)))
-                else:
-                    symptoms.append(str(symptom))
-            plant_info["symptoms"] = symptoms
-            
-            dangerous_plants.append(plant_info)
+        total_plants += 1
+        found = {canonical_animal(a) for a in plant.animals}
+        if wanted and test(found):
+            dangerous_plants.append(_plant_info(plant))
+    return total_plants, dangerous_plants
+
+def _search_in_store(store, animals, match):
+    """Фільтр по бітових масках тварин; словники створюються лише для знайдених рослин."""
+    def describe(index):
+        return {
+            "scientific_name": store.string(store.name_ids[index]),
+            "common_name": store.string(store.common_ids[index]),
+            "family": store.plant_family(index),
+            "severity": store.plant_severity(index),
+            "animals_affected": store.plant_animals(index),
+            "symptoms": store.plant_symptoms(index),
+        }
+    return store.plants_with_animals(store.animal_masks_for(animals), match), describe
+
+@instrumented("search_animals")
+@cached_result("search_animals")
+def search_dangerous_plants_for_animal(animal_name, input_file="plants.json", match="any", stream=False,
+                                      lazy=False):
+    """Пошук рослин, небезпечних для тварини.
+
+    animal_name - назва, синонім ("puppy", "kitten") або кілька назв через
+    кому чи списком; match="any" повертає рослини, небезпечні хоча б для
+    однієї з тварин, match="all" - для всіх одночасно. stream=True читає
+    файл потоково (iter_plants) без завантаження всього документа.
+    lazy=True повертає dangerous_plants як ітератор, що створює словники
+    рослин під час обходу (для потокового save_results).
+    """
+    animals = parse_animals(animal_name)
+
+    if stream:
+        # Файл читається під час обходу: load - час отримання записів з генератора
+        store = None
+        plants = timed_iter(iter_plants(input_file), "load")
+    else:
+        with timed("load"):
+            store = open_columnar_store(input_file)
+            if store is None or not store.plant_count:
+                plants = load_plants_data(input_file)
+    if store is not None and store.plant_count:
+        total_plants = store.plant_count
+        positions, describe = _search_in_store(store, animals, match)
+    elif stream:
+        total_plants, dangerous_plants = _search_in_stream(plants, animals, match)
+        if not total_plants:
+            return {"error": "Не вдалося завантажити дані"}
+        positions, describe = dangerous_plants, None
+    else:
+        if not plants:
+            return {"error": "Не вдалося завантажити дані"}
+        total_plants = len(plants)
+        positions, describe = _search_in_plants(plants, animals, match)
+
+    found = len(positions)
+    if describe is None:
+        dangerous_plants = iter(positions) if lazy else positions
+    else:
+        dangerous_plants = map(describe, positions) if lazy else list(map(describe, positions))
+
+    count_records("scanned", total_plants)
+    count_records("matched", found)
 
     result = {
         "task": "search_animals",
         "timestamp": __import__('datetime').datetime.now().isoformat(),
         "search_animal": animal_name,
-        "total_plants_checked": len(plants),
-        "dangerous_plants_found": len(dangerous_plants),
+        "animals": animals,
+        "match": match,
+        "unknown_animals": [a for a in animals if not is_known_animal(a)],
+        "total_plants_checked": total_plants,
+        "dangerous_plants_found": found,
         "dangerous_plants": dangerous_plants
     }
 
-    log_message = f"Пошук для тварини '{animal_name}': знайдено {len(dangerous_plants)} рослин"
+    log_message = f"Пошук для тварини '{animal_name}': знайдено {found} рослин"
     log_protocol(log_message)
     
     return result
 
-def main():
+def main(argv=None):
     import argparse
     
     parser = argparse.ArgumentParser(description='Пошук рослин, небезпечних для тварин')
-    parser.add_argument('animal', help='Назва тварини (наприклад: dogs, cats, horses)')
+    parser.add_argument('animal', nargs='?', help='Назва тварини або кілька через кому (наприклад: dogs, cats, horses)')
+    parser.add_argument('--all', action='store_true',
+                       help='Лише рослини, небезпечні для всіх вказаних тварин одночасно')
     parser.add_argument('--input', default='plants.json',
                        help='JSON файл з даними (за замовчуванням: plants.json)')
     parser.add_argument('--output', default='results_animal_search.json',
                        help='Файл для збереження результатів')
+    parser.add_argument('--stream', action='store_true',
+                       help='Потокове читання файлу без завантаження всіх даних у пам\'ять')
+    parser.add_argument('--batch', metavar='FILE',
+                       help='JSONL файл із запитами (один JSON об\'єкт з аргументами на рядок)')
+    parser.add_argument('--batch-output', default='-',
+                       help='Файл для JSONL результатів пакетного режиму (за замовчуванням: stdout)')
+    parser.add_argument('--metrics', metavar='FILE',
+                       help='Зберегти метрики фаз задачі у JSON файл (і .prom поруч)')
+    parser.add_argument('--compact', action='store_true',
+                       help='Зберегти результати без відступів (файл з .gz стискається gzip)')
+    parser.add_argument('--lazy', action='store_true',
+                       help='Записувати знайдені рослини у файл під час обходу, без списку в пам\'яті '
+                            '(на екран виводиться лише підсумок)')
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.metrics:
+        enable_metrics(args.metrics)
+
+    if args.batch:
+        stats = run_batch(args.batch, search_dangerous_plants_for_animal, args.batch_output,
+                          {"input_file": args.input, "stream": args.stream})
+        return 0 if stats["errors"] == 0 else 1
 
-    results = search_dangerous_plants_for_animal(args.animal, args.input)
+    if not args.animal:
+        log_error("Назва тварини не вказана")
+        return 1
+
+    match = "all" if args.all else "any"
+    params = {"animal_name": args.animal, "input_file": args.input, "match": match, "stream": args.stream}
+    if args.lazy:
+        # Ітератор не передається через демон - задача виконується локально
+        results = search_dangerous_plants_for_animal(lazy=True, **params)
+    else:
+        results = run_task("search_animals", params, search_dangerous_plants_for_animal)
 
-    if save_results(results, args.output):
+    with timed("serialize", "search_animals"):
+        saved = save_results(results, args.output, compact=args.compact)
+    if saved:
         log(f"Результати збережено у {args.output}")
 
         log(f"Результати пошуку для тварини: {args.animal}")
+        if results.get("unknown_animals"):
+            log_error(f"Невідомі тварини: {', '.join(results['unknown_animals'])}")
         
         if results["dangerous_plants_found"] == 0:
             log_error(f"Рослин, небезпечних для {args.animal}, не знайдено")
+        elif args.lazy:
+            log(f"Знайдено {results['dangerous_plants_found']} небезпечних рослин (список - у {args.output})")
         else:
             log(f"Знайдено {results['dangerous_plants_found']} небезпечних рослин:")
             print(" " * 60)
@@ -3,71 +3,75 @@
 Задача 4: Пошук рослин за симптомом отруєння.
 Знаходить усі рослини, що викликають вказаний симптом.
 """
-from collections import Counter
+import heapq
 import sys
 import os
 
 try:
-    from .utils import load_plants_data, save_results, log_protocol
+    from .utils import load_plants_data, save_results, log_protocol, run_batch
+    from .utils import instrumented, timed, count_records, enable_metrics
+    from .result_cache import cached_result
+    from .indexes import get_symptom_index
+    from .client import run_task
 except ImportError:
-    from utils import load_plants_data, save_results, log_protocol
+    from utils import load_plants_data, save_results, log_protocol, run_batch
+    from utils import instrumented, timed, count_records, enable_metrics
+    from result_cache import cached_result
+    from indexes import get_symptom_index
+    from client import run_task
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from log import log, log_error
 
 
+@instrumented("search_symptoms")
+@cached_result("search_symptoms")
 def search_plants_by_symptom(symptom_query, input_file="plants.json"):
     """Пошук рослин за симптомом отруєння."""
-    plants = load_plants_data(input_file)
+    with timed("load"):
+        plants = load_plants_data(input_file)
     if not plants:
         return {"error": "Не вдалося завантажити дані"}
 
-    query_lower = symptom_query.lower()
-    matching_plants = []
-    all_symptoms = []
+    with timed("index"):
+        index = get_symptom_index(plants)
+    matched_ids = index.match(symptom_query)
 
-    for plant in plants:
-        raw_symptoms = plant.get("symptoms", [])
-        plant_symptoms = []
+    # Запит з помилкою ("vomitting") - шукаємо за найближчим виправленням
+    suggestions = [] if matched_ids else index.suggest(symptom_query)
+    corrected_query = None
+    if suggestions:
+        corrected_query = suggestions[0][0]
+        matched_ids = index.match(corrected_query)
 
-        for symptom in raw_symptoms:
-            if isinstance(symptom, dict):
-                name = symptom.get("name", "")
-            else:
-                name = str(symptom)
-            plant_symptoms.append(name)
-            all_symptoms.append(name)
+    query_lower = (corrected_query or symptom_query).lower()
+    match_counts = index.plant_match_counts(matched_ids)
+    count_records("scanned", len(plants))
+    count_records("matched", len(match_counts))
 
+    # Сортування за кількістю збігів, при рівності - порядок у базі
+    ranked = heapq.nsmallest(20, match_counts, key=lambda pos: (-match_counts[pos], pos))
+
+    matching_plants = []
+    for position in ranked:
+        plant = plants[position]
+        plant_symptoms = [s.name for s in plant.symptoms]
         matched = [s for s in plant_symptoms if query_lower in s.lower()]
 
-        if matched:
-            severity = plant.get("severity", {})
-            if isinstance(severity, dict):
-                sev_label = severity.get("label", "Unknown")
-            else:
-                sev_label = str(severity) if severity else "Unknown"
-
-            matching_plants.append(
-                {
-                    "scientific_name": plant.get("name", "Unknown"),
-                    "common_name": (
-                        plant.get("common", [{}])[0].get("name", "")
-                        if plant.get("common")
-                        else ""
-                    ),
-                    "family": plant.get("family", "Unknown"),
-                    "severity": sev_label,
-                    "matched_symptoms": matched,
-                    "all_symptoms": plant_symptoms,
-                }
-            )
-
-    matching_plants.sort(key=lambda x: len(x["matched_symptoms"]), reverse=True)
-
-    symptom_counts = Counter(all_symptoms)
+        matching_plants.append(
+            {
+                "scientific_name": plant.name,
+                "common_name": plant.common_name,
+                "family": plant.family,
+                "severity": plant.severity.label,
+                "matched_symptoms": matched,
+                "all_symptoms": plant_symptoms,
+            }
+        )
+
     related_symptoms = [
         {"symptom": s, "count": c}
-        for s, c in symptom_counts.most_common(10)
+        for s, c in index.most_common(10)
         if query_lower in s.lower()
     ]
 
@@ -75,21 +79,25 @@ def search_plants_by_symptom(symptom_query, input_file="plants.json"):
         "task": "search_symptoms",
         "timestamp": __import__("datetime").datetime.now().isoformat(),
         "search_query": symptom_query,
+        "corrected_query": corrected_query,
+        "suggestions": [
+            {"symptom": term, "distance": distance} for term, distance in suggestions
+        ],
         "total_plants_checked": len(plants),
-        "plants_with_symptom": len(matching_plants),
+        "plants_with_symptom": len(match_counts),
         "related_symptoms": related_symptoms,
-        "matching_plants": matching_plants[:20],
+        "matching_plants": matching_plants,
     }
 
     log_message = (
-        f"Пошук симптому '{symptom_query}': знайдено {len(matching_plants)} рослин"
+        f"Пошук симптому '{symptom_query}': знайдено {len(match_counts)} рослин"
     )
     log_protocol(log_message)
 
     return result
 
 
-def main():
+def main(argv=None):
     import argparse
 
     parser = argparse.ArgumentParser(description="Пошук рослин за симптомом отруєння")
@@ -105,8 +113,31 @@ def main():
         default="results_symptoms.json",
         help="Файл для збереження результатів",
     )
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="JSONL файл із запитами (один JSON об'єкт з аргументами на рядок)",
+    )
+    parser.add_argument(
+        "--batch-output",
+        default="-",
+        help="Файл для JSONL результатів пакетного режиму (за замовчуванням: stdout)",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="Зберегти метрики фаз задачі у JSON файл (і .prom поруч)",
+    )
+
+    args = parser.parse_args(argv)
+    if args.metrics:
+        enable_metrics(args.metrics)
 
-    args = parser.parse_args()
+    if args.batch:
+        stats = run_batch(
+            args.batch, search_plants_by_symptom, args.batch_output, {"input_file": args.input}
+        )
+        return 0 if stats["errors"] == 0 else 1
 
     if not args.symptom:
         print("\n" + "=" * 50)
@@ -128,18 +159,26 @@ def main():
             log_error("Симптом не вказано")
             return 1
 
-    results = search_plants_by_symptom(args.symptom, args.input)
+    results = run_task(
+        "search_symptoms",
+        {"symptom_query": args.symptom, "input_file": args.input},
+        search_plants_by_symptom,
+    )
 
     if "error" in results:
         log_error(results["error"])
         return 1
 
-    if save_results(results, args.output):
+    with timed("serialize", "search_symptoms"):
+        saved = save_results(results, args.output)
+    if saved:
         log(f"Результати збережено у {args.output}")
 
     print("\n" + "=" * 60)
     print(f"  РЕЗУЛЬТАТИ ПОШУКУ: '{args.symptom}'")
     print("=" * 60)
+    if results.get("corrected_query"):
+        print(f"Можливо, ви мали на увазі: '{results['corrected_query']}'")
     print(
         f"Знайдено рослин: {results['plants_with_symptom']} з {results['total_plants_checked']}"
     )
@@ -4,48 +4,68 @@ import sys
 
 from log import log, log_error
 try:
-    from .utils import load_plants_data, save_results, log_protocol
+    from .utils import load_plants_data, iter_plants, save_results, log_protocol, run_batch
+    from .utils import instrumented, timed, timed_iter, count_records, enable_metrics
+    from .result_cache import cached_result
+    from .columnar import open_columnar_store
+    from .client import run_task
 except ImportError:
-    from utils import load_plants_data, save_results, log_protocol
+    from utils import load_plants_data, iter_plants, save_results, log_protocol, run_batch
+    from utils import instrumented, timed, timed_iter, count_records, enable_metrics
+    from result_cache import cached_result
+    from columnar import open_columnar_store
+    from client import run_task
 
-def analyze_severity_statistics(input_file="plants.json"):
-    plants = load_plants_data(input_file)
-    if not plants:
-        return {"error": "Не вдалося завантажити дані"}
-    
-    severity_levels = []
-    
-    for plant in plants:
-        severity_obj = plant.get('severity', {})
-        
-        if isinstance(severity_obj, dict):
-            label = severity_obj.get('label')
-            if label:
-                severity_levels.append(label)
-            else:
-                for key in ['name', 'level', 'severity']:
-                    if key in severity_obj:
-                        severity_levels.append(str(severity_obj[key]))
-                        break
-                else:
-                    severity_levels.append('Unknown')
-        elif severity_obj:
-            severity_levels.append(str(severity_obj))
+@instrumented("severity_stats")
+@cached_result("severity_stats")
+def analyze_severity_statistics(input_file="plants.json", stream=False):
+    if stream:
+        # Один прохід по файлу без завантаження всього документа; файл читається
+        # під час обходу, тому load - це час отримання записів з генератора
+        store = None
+        plants = timed_iter(iter_plants(input_file), "load")
+    else:
+        with timed("load"):
+            store = open_columnar_store(input_file)
+            if store is None or not store.plant_count:
+                plants = load_plants_data(input_file)
+    if store is not None and store.plant_count:
+        # Підрахунок напряму по стовпцю кодів рівнів небезпеки
+        total_plants = store.plant_count
+        # Векторизований підрахунок (NumPy), без NumPy - по стовпцю кодів;
+        # groupby (і NumPy) імпортується лише тут, решта шляхів його не потребує
+        try:
+            from .groupby import plant_frame
+        except ImportError:
+            from groupby import plant_frame
+        frame = plant_frame(store)
+        if frame is not None:
+            severity_counts = frame.value_counts("severity", drop_empty=False)
         else:
-            severity_levels.append('Unknown')
+            severity_counts = store.severity_counts()
+    else:
+        total_plants = 0
+        severity_counts = Counter()
+        for plant in plants:
+            total_plants += 1
+            severity_counts[plant.severity.label] += 1
+
+        if not total_plants:
+            return {"error": "Не вдалося завантажити дані"}
 
-    severity_counts = Counter(severity_levels)
+    count_records("scanned", total_plants)
+    count_records("matched", total_plants)
 
     result = {
         "task": "severity_stats",
         "timestamp": __import__('datetime').datetime.now().isoformat(),
-        "total_plants_analyzed": len(plants),
+        "total_plants_analyzed": total_plants,
         "severity_distribution": [],
         "summary": {}
     }
 
     for level, count in severity_counts.most_common():
-        percentage = round(count / len(plants) * 100, 2)
+        percentage = round(count / total_plants * 100, 2)
         result["severity_distribution"].append({
             "level": level,
             "count": count,
@@ -67,7 +87,7 @@ def analyze_severity_statistics(input_file="plants.json"):
     
     return result
 
-def main():
+def main(argv=None):
     import argparse
     
     parser = argparse.ArgumentParser(description='Статистика рівнів небезпеки рослин')
@@ -75,12 +95,30 @@ def main():
                        help='JSON файл з даними (за замовчуванням: plants.json)')
     parser.add_argument('--output', default='results_severity_stats.json',
                        help='Файл для збереження результатів')
+    parser.add_argument('--stream', action='store_true',
+                       help='Потокове читання файлу без завантаження всіх даних у пам\'ять')
+    parser.add_argument('--batch', metavar='FILE',
+                       help='JSONL файл із запитами (один JSON об\'єкт з аргументами на рядок)')
+    parser.add_argument('--batch-output', default='-',
+                       help='Файл для JSONL результатів пакетного режиму (за замовчуванням: stdout)')
+    parser.add_argument('--metrics', metavar='FILE',
+                       help='Зберегти метрики фаз задачі у JSON файл (і .prom поруч)')
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.metrics:
+        enable_metrics(args.metrics)
+
+    if args.batch:
+        stats = run_batch(args.batch, analyze_severity_statistics, args.batch_output,
+                          {"input_file": args.input_file, "stream": args.stream})
+        return 0 if stats["errors"] == 0 else 1
 
-    results = analyze_severity_statistics(args.input_file)
+    results = run_task("severity_stats", {"input_file": args.input_file, "stream": args.stream},
+                       analyze_severity_statistics)
 
-    if save_results(results, args.output):
+    with timed("serialize", "severity_stats"):
+        saved = save_results(results, args.output)
+    if saved:
         log(f"Результати збережено у {args.output}")
 
         log(f"Статистика рівнів небезпеки:")
@@ -0,0 +1,149 @@
+# tasks/sketches.py
+"""
+Ймовірнісні структури для потокових агрегацій.
+
+- CountMinSketch - оцінка частот з обмеженою похибкою: оцінка ніколи не
+  менша за точне значення і з імовірністю 1 - delta перевищує його не більше
+  ніж на epsilon * N (N - сума всіх додавань).
+- HyperLogLog - оцінка кількості унікальних значень з відносною похибкою
+  близько 1.04 / sqrt(2^precision).
+- HeavyHitters - k найчастіших ключів за оцінками Count-Min у купі
+  фіксованого розміру.
+
+Пам'ять усіх структур не залежить від кількості записів і унікальних
+значень. Хеші детерміновані (blake2b), тож результат не змінюється між
+запусками.
+"""
+import hashlib
+import heapq
+import math
+
+
+def _hash128(key):
+    """Два незалежні 64-бітні хеші рядка."""
+    digest = hashlib.blake2b(str(key).encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little")
+
+
+class CountMinSketch:
+    """Count-Min Sketch: depth рядків лічильників по width стовпців."""
+
+    def __init__(self, width, depth):
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self.rows = [[0] * width for _ in range(depth)]
+
+    @classmethod
+    def from_error(cls, epsilon=0.001, delta=0.01):
+        """Скетч, у якого похибка оцінки <= epsilon * N з імовірністю 1 - delta."""
+        if not 0 < epsilon < 1 or not 0 < delta < 1:
+            raise ValueError("epsilon і delta мають бути в межах (0, 1)")
+        return cls(math.ceil(math.e / epsilon), math.ceil(math.log(1 / delta)))
+
+    @property
+    def epsilon(self):
+        return math.e / self.width
+
+    @property
+    def delta(self):
+        return math.exp(-self.depth)
+
+    def _columns(self, key):
+        # Подвійне хешування (Кірш-Міценмахер): рядок i бере h1 + i * h2
+        h1, h2 = _hash128(key)
+        return [(h1 + i * h2) % self.width for i in range(self.depth)]
+
+    def add(self, key, n=1):
+        """Додає n входжень key і повертає нову оцінку його частоти."""
+        self.total += n
+        estimate = None
+        for row, column in zip(self.rows, self._columns(key)):
+            row[column] += n
+            if estimate is None or row[column] < estimate:
+                estimate = row[column]
+        return estimate
+
+    def estimate(self, key):
+        return min(row[column] for row, column in zip(self.rows, self._columns(key)))
+
+    def error_bound(self):
+        """Максимальне перевищення точної частоти (з імовірністю 1 - delta)."""
+        return math.ceil(self.epsilon * self.total)
+
+
+class HyperLogLog:
+    """HyperLogLog з 2^precision регістрами по одному байту."""
+
+    def __init__(self, precision=12):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision має бути в межах 4..16")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, key):
+        x = _hash128(key)[0]
+        bits = 64 - self.precision
+        index = x >> bits
+        rest = x & ((1 << bits) - 1)
+        rank = bits - rest.bit_length() + 1  # Позиція першої одиниці
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # Лінійний підрахунок для малих множин
+        return round(estimate)
+
+    @property
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+
+class HeavyHitters:
+    """k ключів з найбільшими оцінками частоти Count-Min.
+
+    Кандидати зберігаються у словнику і мін-купі розміру ~k; застарілі
+    записи купи пропускаються при витісненні, тому повного сортування немає.
+    """
+
+    def __init__(self, k, sketch):
+        self.k = k
+        self.sketch = sketch
+        self.candidates = {}
+        self._heap = []
+
+    def add(self, key, n=1):
+        estimate = self.sketch.add(key, n)
+        if self.k <= 0:
+            return
+        if key in self.candidates:
+            self.candidates[key] = estimate
+        elif len(self.candidates) < self.k:
+            self.candidates[key] = estimate
+        else:
+            smallest = self._smallest()
+            if estimate <= smallest[0]:
+                return
+            heapq.heappop(self._heap)
+            del self.candidates[smallest[1]]
+            self.candidates[key] = estimate
+        heapq.heappush(self._heap, (estimate, key))
+        if len(self._heap) > 4 * self.k:
+            self._heap = [(value, name) for name, value in self.candidates.items()]
+            heapq.heapify(self._heap)
+
+    def _smallest(self):
+        # Застарілі записи купи (оцінка кандидата відтоді зросла) відкидаються
+        while self._heap[0][1] not in self.candidates or \
+                self.candidates[self._heap[0][1]] != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0]
+
+    def top(self):
+        """[(ключ, оцінка), ...] за спаданням оцінки."""
+        return sorted(self.candidates.items(), key=lambda item: (-item[1], item[0]))
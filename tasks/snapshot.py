@@ -0,0 +1,174 @@
+# tasks/snapshot.py
+"""
+Бінарний знімок plants.json.
+
+Знімок зберігається поруч з JSON (plants.json -> plants.snapshot) і містить
+заголовок зі схемою, розміром, mtime та SHA-256 вихідного файлу, за яким
+іде pickle (протокол 5) рядків нормалізованих записів (PlantRecord.to_row).
+"""
+import gc
+import hashlib
+import json
+import os
+import pickle
+import struct
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from log import log, log_error
+
+try:
+    from .normalize import records_from_rows, normalize_plants, report_rejected
+except ImportError:
+    from normalize import records_from_rows, normalize_plants, report_rejected
+
+
+SNAPSHOT_MAGIC = b"GLSNAP"
+SNAPSHOT_VERSION = 3
+SNAPSHOT_SUFFIX = ".snapshot"
+
+# magic, версія схеми, розмір JSON, mtime JSON (нс), SHA-256 JSON
+_HEADER = struct.Struct("<6sHQq32s")
+
+
+def snapshot_path(json_path):
+    """Шлях до знімка для вказаного JSON файлу."""
+    return os.path.splitext(json_path)[0] + SNAPSHOT_SUFFIX
+
+
+def file_sha256(path):
+    """SHA-256 вмісту файлу."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def _share_values(obj, memo):
+    """Замінює однакові рядки та кортежі спільними об'єктами.
+
+    Pickle записує повторювані об'єкти як посилання, тому знімок стає
+    компактнішим, а його завантаження - швидшим.
+    """
+    if isinstance(obj, str):
+        return memo.setdefault(obj, obj)
+    if isinstance(obj, list):
+        return [_share_values(item, memo) for item in obj]
+    if isinstance(obj, tuple):
+        shared = tuple(_share_values(item, memo) for item in obj)
+        return memo.setdefault(shared, shared)
+    return obj
+
+
+def write_snapshot(json_path, data=None):
+    """Створює знімок для json_path. Повертає шлях до знімка або None.
+
+    data - вже нормалізовані записи; без них JSON читається і нормалізується.
+    """
+    try:
+        stat = os.stat(json_path)
+        source_hash = file_sha256(json_path)
+
+        if data is None:
+            with open(json_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict) and "data" in data:
+                data = data["data"]
+            data, rejected = normalize_plants(data)
+            report_rejected(rejected, json_path)
+
+        rows = [plant.to_row() for plant in data]
+        payload = pickle.dumps(_share_values(rows, {}), protocol=5)
+        header = _HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, stat.st_size, stat.st_mtime_ns, source_hash
+        )
+
+        path = snapshot_path(json_path)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            f.write(payload)
+        os.replace(tmp_path, path)
+        return path
+    except Exception as e:
+        log_error(f"Не вдалося створити знімок: {e}")
+        return None
+
+
+def _check_header(f, json_path):
+    """Читає заголовок знімка і перевіряє, чи відповідає він json_path."""
+    header = f.read(_HEADER.size)
+    if len(header) != _HEADER.size:
+        return False
+    magic, version, size, mtime_ns, source_hash = _HEADER.unpack(header)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        return False
+
+    stat = os.stat(json_path)
+    if stat.st_size != size:
+        return False
+    # Збігається лише розмір (файл перезаписано) - звіряємо вміст
+    return stat.st_mtime_ns == mtime_ns or file_sha256(json_path) == source_hash
+
+
+def snapshot_is_fresh(json_path):
+    """Чи існує актуальний знімок для json_path."""
+    try:
+        with open(snapshot_path(json_path), "rb") as f:
+            return _check_header(f, json_path)
+    except OSError:
+        return False
+
+
+def load_snapshot(json_path):
+    """Завантажує знімок, якщо він відповідає поточному json_path, інакше None.
+
+    Знімок вважається свіжим, коли збігаються розмір і mtime JSON; якщо
+    збігається лише розмір, порівнюється SHA-256 вмісту.
+    """
+    path = snapshot_path(json_path)
+    try:
+        with open(path, "rb") as f:
+            if not _check_header(f, json_path):
+                return None
+            payload = f.read()
+    except OSError:
+        return None
+
+    # Збирач сміття не потрібен під час розпакування великого дерева об'єктів
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return records_from_rows(pickle.loads(payload))
+    except Exception as e:
+        log_error(f"Пошкоджений знімок {path}: {e}")
+        return None
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Створення бінарного знімка plants.json")
+    parser.add_argument("input_file", nargs="?", default="plants.json",
+                        help="JSON файл з даними (за замовчуванням: plants.json)")
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input_file):
+        log_error(f"Файл {args.input_file} не знайдено")
+        return 1
+
+    path = write_snapshot(args.input_file)
+    if path is None:
+        return 1
+
+    log(f"Знімок збережено у {path} ({os.path.getsize(path) / 1024:.1f} KB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
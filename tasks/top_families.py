@@ -4,28 +4,116 @@ import sys
 
 from log import log, log_error
 try:
-    from .utils import load_plants_data, save_results, log_protocol
+    from .utils import load_plants_data, iter_plants, save_results, log_protocol, run_batch
+    from .utils import instrumented, timed, timed_iter, count_records, enable_metrics
+    from .result_cache import cached_result
+    from .columnar import open_columnar_store
+    from .client import run_task
+    from .sketches import CountMinSketch, HyperLogLog, HeavyHitters
 except ImportError:
-    from utils import load_plants_data, save_results, log_protocol
+    from utils import load_plants_data, iter_plants, save_results, log_protocol, run_batch
+    from utils import instrumented, timed, timed_iter, count_records, enable_metrics
+    from result_cache import cached_result
+    from columnar import open_columnar_store
+    from client import run_task
+    from sketches import CountMinSketch, HyperLogLog, HeavyHitters
 
-def analyze_top_families(input_file="plants.json", limit=5):
-    plants = load_plants_data(input_file)
-    if not plants:
-        return {"error": "Не вдалося завантажити дані"}
+HLL_PRECISION = 12
 
-    families = []
+
+def _approximate_counts(plants, limit, epsilon, delta):
+    """Один прохід з пам'яттю, що не залежить від кількості родин.
+
+    Повертає (кількість рослин, кількість з родиною, [(родина, оцінка)],
+    оцінка кількості родин, опис похибок).
+    """
+    sketch = CountMinSketch.from_error(epsilon, delta)
+    hitters = HeavyHitters(limit, sketch)
+    unique = HyperLogLog(HLL_PRECISION)
+    total_plants = 0
     for plant in plants:
-        family = plant.get('family')
+        total_plants += 1
+        family = plant.family
         if family:
-            families.append(family)
+            hitters.add(family)
+            unique.add(family)
+
+    approximation = {
+        "method": "count-min sketch + hyperloglog",
+        "count_error_bound": sketch.error_bound(),
+        "count_confidence": round(1 - sketch.delta, 4),
+        "unique_families_relative_error": round(unique.relative_error, 4),
+        "sketch_width": sketch.width,
+        "sketch_depth": sketch.depth,
+    }
+    return total_plants, sketch.total, hitters.top(), unique.count(), approximation
+
 
-    family_counts = Counter(families).most_common(limit)
+@instrumented("top_families")
+@cached_result("top_families")
+def analyze_top_families(input_file="plants.json", limit=5, stream=False,
+                         approximate=False, epsilon=0.001, delta=0.01):
+    """Топ родин за кількістю рослин.
+
+    approximate=True рахує за один прохід Count-Min Sketch і HyperLogLog
+    (завжди потоково, тож пам'ять не залежить від розміру файлу):
+    кількості в топі - верхні оцінки (перевищення не більше count_error_bound
+    з імовірністю count_confidence), кількість родин - оцінка з відносною
+    похибкою unique_families_relative_error.
+    """
+    approximation = None
+    if approximate and not (0 < epsilon < 1 and 0 < delta < 1):
+        return {"error": "epsilon і delta мають бути в межах (0, 1)"}
+    if stream or approximate:
+        # Один прохід по файлу без завантаження всього документа; файл читається
+        # під час обходу, тому load - це час отримання записів з генератора
+        store = None
+        plants = timed_iter(iter_plants(input_file), "load")
+    else:
+        with timed("load"):
+            store = open_columnar_store(input_file)
+            if store is None or not store.plant_count:
+                plants = load_plants_data(input_file)
+    if store is not None and store.plant_count:
+        # Підрахунок напряму по стовпцю кодів родин
+        total_plants = store.plant_count
+        # Векторизований підрахунок (NumPy), без NumPy - по стовпцю кодів;
+        # groupby (і NumPy) імпортується лише тут, решта шляхів його не потребує
+        try:
+            from .groupby import plant_frame
+        except ImportError:
+            from groupby import plant_frame
+        frame = plant_frame(store)
+        counter = frame.value_counts("family") if frame is not None else store.family_counts()
+    else:
+        if approximate:
+            total_plants, matched, family_counts, unique_families, approximation = \
+                _approximate_counts(plants, limit, epsilon, delta)
+        else:
+            total_plants = 0
+            counter = Counter()
+            for plant in plants:
+                total_plants += 1
+                family = plant.family
+                if family:
+                    counter[family] += 1
+
+        if not total_plants:
+            return {"error": "Не вдалося завантажити дані"}
+
+    if approximation is None:
+        matched = sum(counter.values())
+        unique_families = len(counter)
+        # most_common(limit) відбирає топ купою розміру limit, без сортування всіх родин
+        family_counts = counter.most_common(limit)
+    count_records("scanned", total_plants)
+    count_records("matched", matched)
 
     result = {
         "task": "top_families",
         "timestamp": __import__('datetime').datetime.now().isoformat(),
-        "total_plants_processed": len(plants),
-        "unique_families_count": len(set(families)),
+        "total_plants_processed": total_plants,
+        "unique_families_count": unique_families,
         "top_families": []
     }
     
@@ -34,14 +122,16 @@ def analyze_top_families(input_file="plants.json", limit=5):
             "rank": rank,
             "family": family,
             "count": count,
-            "percentage": round(count / len(plants) * 100, 2)
+            "percentage": round(count / total_plants * 100, 2)
         })
+    if approximation is not None:
+        result["approximation"] = approximation
 
-    log_message = f"Завдання 'top_families': проаналізовано {len(plants)} рослин"
+    log_message = f"Завдання 'top_families': проаналізовано {total_plants} рослин"
     log_protocol(log_message)
     return result
 
-def main():
+def main(argv=None):
     import argparse
     
     parser = argparse.ArgumentParser(description='Аналіз топ родин отруйних рослин')
@@ -51,17 +141,49 @@ def main():
                        help='Кількість родин для виведення (за замовчуванням: 5)')
     parser.add_argument('--output', default='results_top_families.json',
                        help='Файл для збереження результатів')
+    parser.add_argument('--stream', action='store_true',
+                       help='Потокове читання файлу без завантаження всіх даних у пам\'ять')
+    parser.add_argument('--approximate', action='store_true',
+                       help='Наближений підрахунок (Count-Min Sketch і HyperLogLog) з фіксованою пам\'яттю; '
+                            'файл завжди читається потоково')
+    parser.add_argument('--epsilon', type=float, default=0.001,
+                       help='Допустима похибка кількості як частка всіх рослин (за замовчуванням: 0.001)')
+    parser.add_argument('--delta', type=float, default=0.01,
+                       help='Імовірність перевищення похибки (за замовчуванням: 0.01)')
+    parser.add_argument('--batch', metavar='FILE',
+                       help='JSONL файл із запитами (один JSON об\'єкт з аргументами на рядок)')
+    parser.add_argument('--batch-output', default='-',
+                       help='Файл для JSONL результатів пакетного режиму (за замовчуванням: stdout)')
+    parser.add_argument('--metrics', metavar='FILE',
+                       help='Зберегти метрики фаз задачі у JSON файл (і .prom поруч)')
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.metrics:
+        enable_metrics(args.metrics)
+
+    if args.batch:
+        stats = run_batch(args.batch, analyze_top_families, args.batch_output,
+                          {"input_file": args.input_file, "stream": args.stream})
+        return 0 if stats["errors"] == 0 else 1
 
-    results = analyze_top_families(args.input_file, args.limit)
+    params = {"input_file": args.input_file, "limit": args.limit, "stream": args.stream}
+    if args.approximate:
+        params.update(approximate=True, epsilon=args.epsilon, delta=args.delta)
+    results = run_task("top_families", params, analyze_top_families)
 
-    if save_results(results, args.output):
+    with timed("serialize", "top_families"):
+        saved = save_results(results, args.output)
+    if saved:
         log(f"Результати збережено у {args.output}")
         log(f"Топ {args.limit} найпоширеніших родин:")
         for item in results.get("top_families", []):
             print(f"    {item['rank']}. {item['family']} - {item['count']} видів ({item['percentage']}%)")
         log(f"Всього унікальних родин: {results.get('unique_families_count')}")
+        approximation = results.get("approximation")
+        if approximation:
+            log(f"Наближений підрахунок: кількості завищені не більше ніж на "
+                f"{approximation['count_error_bound']} (імовірність {approximation['count_confidence']:.0%}), "
+                f"похибка кількості родин ~{approximation['unique_families_relative_error']:.1%}")
         
         return 0
     else:
@@ -1,43 +1,645 @@
 # tasks/utils.py
+import atexit
+import collections
+import collections.abc
+import contextlib
+import contextvars
+import functools
+import gzip
 import json
+import math
 import os
-import datetime
+import sys
+import tempfile
+import threading
+import time
 
 from log import log_error
+try:
+    from .snapshot import load_snapshot
+    from .normalize import normalize_plant, normalize_plants, report_rejected
+    from .protocol import ProtocolLogger, lock_file, unlock_file
+except ImportError:
+    from snapshot import load_snapshot
+    from normalize import normalize_plant, normalize_plants, report_rejected
+    from protocol import ProtocolLogger, lock_file, unlock_file
+
+# Кеш розпарсених даних: шлях -> (розмір, mtime, дані)
+_plants_cache = {}
+_plants_cache_lock = threading.Lock()
+_plants_cache_stats = {"hits": 0, "misses": 0}
+
+_protocol = ProtocolLogger(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'protocol.txt'))
+
+_protocol_capture = contextvars.ContextVar("greenleaf_protocol_capture", default=None)
 
 def log_protocol(message):
-    protocol_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'protocol.txt')
+    """Додає запис у protocol.txt (запис у файл виконує фоновий потік)."""
+    captured = _protocol_capture.get()
+    if captured is not None:
+        captured.append(message)
+    _protocol.write(message)
 
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+@contextlib.contextmanager
+def capture_protocol():
+    """Збирає у список записи протоколу поточного контексту (вони все одно пишуться у файл)."""
+    captured = []
+    token = _protocol_capture.set(captured)
     try:
-        with open(protocol_path, 'a', encoding='utf-8') as f:
-            f.write(f"[{timestamp}] {message}\n")
-    except Exception as e:
-        log_error(f"{e}")
+        yield captured
+    finally:
+        _protocol_capture.reset(token)
 
-def load_plants_data(filename="plants.json"):
-    if not os.path.exists(filename):
-        parent_file = os.path.join("..", filename)
-        if os.path.exists(parent_file):
-            filename = parent_file
-        else:
-            return []
-            
+def flush_protocol():
+    """Дописує у protocol.txt усі записи з черги."""
+    _protocol.flush()
+
+def set_protocol_path(path):
+    """Перенаправляє журнал у інший файл (бенчмарки, тести). Повертає попередній шлях."""
+    _protocol.flush()
+    previous = _protocol.path
+    _protocol.path, _protocol.lock_path = path, path + ".lock"
+    return previous
+
+# Інструментування: вмикається змінною GREENLEAF_METRICS=<файл.json> або enable_metrics()
+METRICS_SAMPLES = 1000
+_metrics = None
+_metrics_lock = threading.Lock()
+_current_run = contextvars.ContextVar("greenleaf_task_run", default=None)
+_NULL_TIMER = contextlib.nullcontext()
+
+class _Metrics:
+    """Тривалості фаз (останні METRICS_SAMPLES вимірів) і лічильники за задачами."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.timings = {}
+        self.counters = collections.Counter()
+
+    def observe(self, task, phase, seconds):
+        with _metrics_lock:
+            entry = self.timings.get((task, phase))
+            if entry is None:
+                entry = self.timings[(task, phase)] = [0, 0.0, collections.deque(maxlen=METRICS_SAMPLES)]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2].append(seconds)
+
+    def count(self, task, name, n):
+        with _metrics_lock:
+            self.counters[(task, name)] += n
+
+class _TaskRun:
+    def __init__(self, task):
+        self.task = task
+        self.depth = 0
+        self.accounted = 0.0
+
+class _Timer:
+    def __init__(self, phase, task):
+        self.phase = phase
+        self.task = task
+
+    def __enter__(self):
+        self.run = _current_run.get()
+        if self.run is not None:
+            self.run.depth += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        run = self.run
+        if run is not None:
+            run.depth -= 1
+            if run.depth == 0:
+                run.accounted += elapsed
+        task = self.task or (run.task if run is not None else "loader")
+        if _metrics is not None:
+            _metrics.observe(task, self.phase, elapsed)
+        return False
+
+def enable_metrics(path=None):
+    """Вмикає збір метрик; path - JSON файл для експорту при завершенні процесу."""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = _Metrics(path)
+            if path:
+                atexit.register(export_metrics)
+        elif path:
+            _metrics.path = path
+    return _metrics
+
+def timed(phase, task=None):
+    """Контекстний менеджер, що вимірює фазу задачі (без задачі - поточної)."""
+    if _metrics is None:
+        return _NULL_TIMER
+    return _Timer(phase, task)
+
+def timed_iter(iterable, phase, task=None):
+    """Обгортка ітератора: час отримання всіх елементів - один вимір фази phase.
+
+    Для потокових джерел (iter_plants), де читання і розбір файлу
+    відбуваються під час обходу, а не під час створення генератора.
+    """
+    if _metrics is None:
+        return iterable
+    return _timed_iter(iter(iterable), phase, task)
+
+def _timed_iter(iterator, phase, task):
+    run = _current_run.get()
+    elapsed = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - start
+            yield item
+    finally:
+        if run is not None and run.depth == 0:
+            run.accounted += elapsed
+        task = task or (run.task if run is not None else "loader")
+        if _metrics is not None:
+            _metrics.observe(task, phase, elapsed)
+
+def count_records(name, n=1, task=None):
+    """Збільшує лічильник записів (scanned, matched, ...) поточної задачі."""
+    if _metrics is None:
+        return
+    if task is None:
+        run = _current_run.get()
+        task = run.task if run is not None else "loader"
+    _metrics.count(task, name, n)
+
+def instrumented(task):
+    """Декоратор функції задачі: фази total і compute (total мінус виміряні фази)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _metrics is None:
+                return func(*args, **kwargs)
+            run = _TaskRun(task)
+            token = _current_run.set(run)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                total = time.perf_counter() - start
+                _current_run.reset(token)
+                if _metrics is not None:
+                    _metrics.observe(task, "total", total)
+                    _metrics.observe(task, "compute", max(0.0, total - run.accounted))
+        return wrapper
+    return decorator
+
+def _percentile(samples, q):
+    """Перцентиль за методом найближчого рангу."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+def metrics_snapshot():
+    """Зведення метрик: {"timings": [...], "counters": [...]} (порожнє, якщо вимкнено)."""
+    result = {"timings": [], "counters": []}
+    if _metrics is None:
+        return result
+    with _metrics_lock:
+        for (task, phase), (n, total, samples) in sorted(_metrics.timings.items()):
+            result["timings"].append({
+                "task": task, "phase": phase, "count": n, "sum": round(total, 6),
+                "p50": round(_percentile(samples, 0.5), 6),
+                "p99": round(_percentile(samples, 0.99), 6),
+                "max": round(max(samples), 6),
+                "samples": [round(s, 6) for s in samples],
+            })
+        for (task, name), value in sorted(_metrics.counters.items()):
+            result["counters"].append({"task": task, "name": name, "value": value})
+    return result
+
+def _merge_metrics(previous, current):
+    """Об'єднує експорт попередніх процесів з поточним зведенням."""
+    timings = {(t["task"], t["phase"]): t for t in previous.get("timings", [])}
+    for t in current["timings"]:
+        old = timings.get((t["task"], t["phase"]))
+        if old is not None:
+            samples = (old.get("samples", []) + t["samples"])[-METRICS_SAMPLES:]
+            t = dict(t, count=old["count"] + t["count"], sum=round(old["sum"] + t["sum"], 6),
+                     samples=samples, p50=round(_percentile(samples, 0.5), 6),
+                     p99=round(_percentile(samples, 0.99), 6), max=max(old["max"], t["max"]))
+        timings[(t["task"], t["phase"])] = t
+    counters = collections.Counter({(c["task"], c["name"]): c["value"]
+                                    for c in previous.get("counters", [])})
+    for c in current["counters"]:
+        counters[(c["task"], c["name"])] += c["value"]
+    return {
+        "timings": [timings[key] for key in sorted(timings)],
+        "counters": [{"task": task, "name": name, "value": value}
+                     for (task, name), value in sorted(counters.items())],
+    }
+
+def metrics_prometheus(snapshot=None):
+    """Метрики у текстовому форматі Prometheus."""
+    snapshot = snapshot or metrics_snapshot()
+    lines = ["# HELP greenleaf_task_phase_seconds Тривалість фази задачі",
+             "# TYPE greenleaf_task_phase_seconds summary"]
+    for t in snapshot["timings"]:
+        labels = f'task="{t["task"]}",phase="{t["phase"]}"'
+        lines.append(f'greenleaf_task_phase_seconds{{{labels},quantile="0.5"}} {t["p50"]}')
+        lines.append(f'greenleaf_task_phase_seconds{{{labels},quantile="0.99"}} {t["p99"]}')
+        lines.append(f'greenleaf_task_phase_seconds_sum{{{labels}}} {t["sum"]}')
+        lines.append(f'greenleaf_task_phase_seconds_count{{{labels}}} {t["count"]}')
+    lines += ["# HELP greenleaf_task_records_total Кількість записів, оброблених задачею",
+              "# TYPE greenleaf_task_records_total counter"]
+    for c in snapshot["counters"]:
+        lines.append(f'greenleaf_task_records_total{{task="{c["task"]}",kind="{c["name"]}"}} {c["value"]}')
+    return "\n".join(lines) + "\n"
+
+def export_metrics(path=None):
+    """Дописує метрики процесу в JSON файл і поруч у .prom (формат Prometheus).
+
+    Експорт кількох процесів об'єднується під міжпроцесним блокуванням.
+    """
+    path = path or (_metrics.path if _metrics is not None else None)
+    if not path or _metrics is None:
+        return None
     try:
+        with open(path + ".lock", "a+b") as lock:
+            lock_file(lock)
+            try:
+                previous = {}
+                if os.path.exists(path):
+                    with open(path, 'r', encoding='utf-8') as f:
+                        previous = json.load(f)
+                merged = _merge_metrics(previous, metrics_snapshot())
+                with _metrics_lock:
+                    _metrics.timings.clear()
+                    _metrics.counters.clear()
+
+                for target, content in ((path, json.dumps(merged, ensure_ascii=False, indent=2)),
+                                        (os.path.splitext(path)[0] + ".prom", metrics_prometheus(merged))):
+                    tmp_path = f"{target}.{os.getpid()}.tmp"
+                    with open(tmp_path, 'w', encoding='utf-8') as f:
+                        f.write(content)
+                    os.replace(tmp_path, target)
+            finally:
+                unlock_file(lock)
+        return path
+    except Exception as e:
+        log_error(f"Не вдалося експортувати метрики: {e}")
+        return None
+
+if os.environ.get("GREENLEAF_METRICS"):
+    enable_metrics(os.environ["GREENLEAF_METRICS"])
+
+def resolve_data_file(filename="plants.json"):
+    """Повертає шлях до файлу даних (з пошуком у батьківській папці) або None."""
+    if os.path.exists(filename):
+        return filename
+    parent_file = os.path.join("..", filename)
+    if os.path.exists(parent_file):
+        return parent_file
+    return None
+
+def _read_plants_file(filename):
+    with timed("snapshot"):
+        data = load_snapshot(filename)
+    if data is not None:
+        return data
+
+    with timed("parse"):
         with open(filename, 'r', encoding='utf-8') as f:
             data = json.load(f)
-            if isinstance(data, dict) and "data" in data:
-                return data["data"]
+    if isinstance(data, dict) and "data" in data:
+        data = data["data"]
+    with timed("normalize"):
+        plants, rejected = normalize_plants(data)
+    report_rejected(rejected, filename)
+    return plants
+
+def load_plants_data(filename="plants.json", use_cache=True):
+    """Завантажує список рослин у канонічній схемі (tasks/normalize.py).
+
+    Якщо поруч лежить свіжий бінарний знімок (tasks/snapshot.py), дані
+    читаються з нього, інакше - з JSON. Розпарсені дані кешуються на рівні
+    процесу за реальним шляхом файлу, його розміром і часом модифікації,
+    тому повторні виклики не парсять JSON заново, а змінений файл ніколи
+    не віддається із застарілого кешу.
+    Повернений список спільний для всіх викликів - його не можна змінювати.
+    """
+    filename = resolve_data_file(filename)
+    if filename is None:
+        return []
+
+    try:
+        stat = os.stat(filename)
+        path = os.path.realpath(filename)
+        signature = (stat.st_size, stat.st_mtime_ns)
+
+        if not use_cache:
+            return _read_plants_file(filename)
+
+        with _plants_cache_lock:
+            cached = _plants_cache.get(path)
+            if cached is not None and cached[0] == signature:
+                _plants_cache_stats["hits"] += 1
+                return cached[1]
+
+            _plants_cache_stats["misses"] += 1
+            data = _read_plants_file(filename)
+            _plants_cache[path] = (signature, data)
             return data
     except Exception as e:
         log_error(f"{e}")
         return []
 
-def save_results(data, filename):
+def cached_plants(filename="plants.json"):
+    """Останній закешований список рослин для файлу (навіть застарілий) або None."""
+    filename = resolve_data_file(filename)
+    if filename is None:
+        return None
+    with _plants_cache_lock:
+        cached = _plants_cache.get(os.path.realpath(filename))
+    return cached[1] if cached is not None else None
+
+def store_plants_cache(filename, plants):
+    """Кладе вже розпарсений список рослин у кеш для поточної версії файлу."""
+    filename = resolve_data_file(filename)
+    if filename is None:
+        return
+    stat = os.stat(filename)
+    with _plants_cache_lock:
+        _plants_cache[os.path.realpath(filename)] = ((stat.st_size, stat.st_mtime_ns), plants)
+
+_decoder = json.JSONDecoder()
+
+def _skip_whitespace(buffer, pos):
+    while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+        pos += 1
+    return pos
+
+def iter_plants(filename="plants.json", chunk_size=1 << 16):
+    """Потоково читає рослини з JSON файлу, не завантажуючи весь документ.
+
+    Підтримує як масив верхнього рівня, так і об'єкт з ключем "data".
+    Пам'ять обмежена розміром одного запису та буфера читання. Записи
+    нормалізуються до канонічної схеми, некоректні пропускаються.
+    """
+    filename = resolve_data_file(filename)
+    if filename is None:
+        return
+
+    rejected = []
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        with open(filename, 'r', encoding='utf-8') as f:
+            buffer = ''
+            pos = 0
+            eof = False
+
+            def fill():
+                nonlocal buffer, pos, eof
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    eof = True
+                buffer = buffer[pos:] + chunk
+                pos = 0
+
+            def decode():
+                """Декодує наступне значення, дочитуючи файл за потреби."""
+                nonlocal pos
+                while True:
+                    start = _skip_whitespace(buffer, pos)
+                    try:
+                        value, end = _decoder.raw_decode(buffer, start)
+                        # Значення на межі блоку могло бути обрізане - потрібен наступний символ
+                        if _skip_whitespace(buffer, end) < len(buffer) or eof:
+                            pos = end
+                            return value
+                    except json.JSONDecodeError:
+                        if eof:
+                            raise
+                    fill()
+
+            def next_char():
+                nonlocal pos
+                while True:
+                    pos = _skip_whitespace(buffer, pos)
+                    if pos < len(buffer):
+                        return buffer[pos]
+                    if eof:
+                        raise ValueError("Неочікуваний кінець файлу")
+                    fill()
+
+            if next_char() == '{':
+                # Шукаємо масив у ключі "data", інші значення пропускаємо
+                pos += 1
+                while True:
+                    if next_char() == '}':
+                        return
+                    key = decode()
+                    if next_char() != ':':
+                        raise ValueError("Очікувався символ ':'")
+                    pos += 1
+                    if key == 'data' and next_char() == '[':
+                        break
+                    decode()
+                    if next_char() == ',':
+                        pos += 1
+            elif buffer[pos] != '[':
+                raise ValueError("Очікувався масив рослин")
+
+            pos += 1
+            index = 0
+            while True:
+                char = next_char()
+                if char == ']':
+                    break
+                if char == ',':
+                    pos += 1
+                    continue
+                raw = decode()
+                try:
+                    plant = normalize_plant(raw)
+                except ValueError as e:
+                    name = raw.get("name") if isinstance(raw, dict) else None
+                    rejected.append({"index": index, "name": name, "reason": str(e)})
+                else:
+                    yield plant
+                index += 1
+    except Exception as e:
+        log_error(f"{e}")
+    report_rejected(rejected, filename)
+
+def plants_cache_stats():
+    """Статистика кешу даних: кількість влучань, промахів і записів."""
+    with _plants_cache_lock:
+        return {
+            "hits": _plants_cache_stats["hits"],
+            "misses": _plants_cache_stats["misses"],
+            "entries": len(_plants_cache),
+        }
+
+def clear_plants_cache():
+    """Очищає кеш даних і скидає лічильники."""
+    with _plants_cache_lock:
+        _plants_cache.clear()
+        _plants_cache_stats["hits"] = 0
+        _plants_cache_stats["misses"] = 0
+
+WRITE_BUFFER_SIZE = 1 << 20
+
+def _encode_json(value, compact, level=0):
+    """JSON значення з відступами рівня level (як у json.dump з indent=2)."""
+    if compact:
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    text = json.dumps(value, ensure_ascii=False, indent=2)
+    return text.replace("\n", "\n" + "  " * level) if level else text
+
+def _write_json(write, data, compact):
+    """Пише data частинами; значення-ітератори верхнього рівня - поелементно."""
+    def write_value(value, level):
+        if not isinstance(value, collections.abc.Iterator):
+            write(_encode_json(value, compact, level))
+            return
+        inner = "" if compact else "\n" + "  " * (level + 1)
+        write("[")
+        empty = True
+        for item in value:
+            write(("," if not empty else "") + inner + _encode_json(item, compact, level + 1))
+            empty = False
+        if not empty and not compact:
+            write("\n" + "  " * level)
+        write("]")
+
+    if not isinstance(data, dict):
+        write_value(data, 0)
+        return
+    inner = "" if compact else "\n  "
+    separator = ":" if compact else ": "
+    write("{")
+    for i, (key, value) in enumerate(data.items()):
+        write(("," if i else "") + inner + json.dumps(str(key), ensure_ascii=False) + separator)
+        write_value(value, 1)
+    if data and not compact:
+        write("\n")
+    write("}")
+
+def _process_umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+# Права файлу, створеного open(): 0666 з урахуванням umask. umask читається
+# один раз під час імпорту, до запуску робочих потоків.
+DEFAULT_FILE_MODE = 0o666 & ~_process_umask()
+
+def set_default_mode(fd):
+    """Звичайні права для файлу з tempfile.mkstemp (він створює файли з 0600)."""
+    if hasattr(os, "fchmod"):
+        os.fchmod(fd, DEFAULT_FILE_MODE)
+
+def save_results(data, filename, compact=False, compress=None):
+    """Зберігає результат задачі у JSON файл.
+
+    compact=True пише без відступів і пробілів; compress=True (або ім'я
+    файлу з .gz) стискає gzip. Ітератори (генератори) серед значень
+    верхнього рівня data записуються поелементно, без побудови списку в
+    пам'яті. Файл пишеться через буфер у тимчасовий і атомарно замінює
+    попередній, тому читач ніколи не побачить частково записаний результат.
+    """
+    if compress is None:
+        compress = filename.endswith(".gz")
+    tmp_path = None
+    try:
+        # Унікальне тимчасове ім'я: save_results викликають і паралельні потоки одного процесу
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(filename)}.", suffix=".tmp",
+                                        dir=os.path.dirname(os.path.abspath(filename)))
+        try:
+            set_default_mode(fd)  # Права як у файлу, створеного open(), а не 0600
+        finally:
+            os.close(fd)
+        if compress:
+            f = gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6)
+        else:
+            f = open(tmp_path, 'w', encoding='utf-8')
+        with f:
+            pending = []
+            pending_size = 0
+
+            def write(text):
+                nonlocal pending_size
+                pending.append(text)
+                pending_size += len(text)
+                if pending_size >= WRITE_BUFFER_SIZE:
+                    f.write("".join(pending))
+                    pending.clear()
+                    pending_size = 0
+
+            _write_json(write, data, compact)
+            f.write("".join(pending))
+        os.replace(tmp_path, filename)
         return True
     except Exception as e:
         log_error(f"{e}")
-        return False
\ No newline at end of file
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return False
+
+def run_batch(batch_file, task_func, output="-", defaults=None):
+    """Виконує запити з JSONL файлу: один JSON об'єкт з аргументами задачі на рядок.
+
+    Дані та індекси завантажуються один раз, однакові запити обчислюються
+    один раз, а результати записуються у JSONL (output або stdout) одразу
+    після виконання кожного запиту. Повертає статистику виконання.
+    """
+    stats = {"queries": 0, "unique": 0, "errors": 0}
+    computed = {}
+    out = sys.stdout if output in (None, "-") else open(output, 'w', encoding='utf-8')
+    try:
+        with open(batch_file, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                stats["queries"] += 1
+                record = {"line": line_no}
+                try:
+                    query = json.loads(line)
+                    if not isinstance(query, dict):
+                        raise ValueError("Запит має бути JSON об'єктом")
+                    record["query"] = query
+                    if query.get("lazy"):
+                        # Ледачий результат - ітератор, його не можна записати у JSONL
+                        raise ValueError("Параметр lazy не підтримується в пакетному режимі")
+                    params = dict(defaults or {})
+                    params.update(query)
+
+                    key = json.dumps(params, sort_keys=True, ensure_ascii=False)
+                    if key not in computed:
+                        stats["unique"] += 1
+                        computed[key] = task_func(**params)
+                    record["result"] = computed[key]
+                    text = json.dumps(record, ensure_ascii=False)
+                    if "error" in record["result"]:
+                        stats["errors"] += 1
+                except Exception as e:
+                    stats["errors"] += 1
+                    record.pop("result", None)
+                    record["error"] = str(e)
+                    text = json.dumps(record, ensure_ascii=False)
+
+                out.write(text + "\n")
+                out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print(f"Пакетний режим: {stats['queries']} запитів, {stats['unique']} унікальних, "
+          f"{stats['errors']} помилок", file=sys.stderr)
+    return stats